@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+"""
+Checks BuildWatcher.run against the fake Jenkins.
+
+A release build whose downstream build succeeds must have both named and
+kept. One that fails never triggers its downstream build, and must be
+reported as failed straight away rather than after waiting out the
+downstream build's timeout. Fails if either goes wrong or the failure takes
+longer than FAILURE_SECONDS to report.
+
+usage: benchmarks/build_watch.py
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_jenkins  # noqa: E402
+from build_watcher import BuildWatcher, BuildWatchError  # noqa: E402
+from jenkins_client import PooledJenkins  # noqa: E402
+
+FAILURE_SECONDS = 5
+
+CONFIG = '<project><childProjects>{}</childProjects></project>'
+
+
+# String -> [List-of String]
+def check(result):
+    """
+    Problems found running a release whose upstream build ends in result.
+    """
+    jenkins = fake_jenkins.FakeJenkins()
+    jenkins.add_job('commcare-core-2.6', CONFIG.format('commcare-android-2.6'),
+                    result=result)
+    jenkins.add_job('commcare-android-2.6', CONFIG.format(''))
+    client = PooledJenkins(jenkins.start(), 'bench', 'bench')
+    problems = []
+    start = time.perf_counter()
+    try:
+        builds = BuildWatcher(client).run('commcare-core-2.6',
+                                          'commcare-android-2.6', '2.6.0')
+        error = None
+    except BuildWatchError as e:
+        builds, error = None, str(e)
+    finally:
+        elapsed = time.perf_counter() - start
+        client.close()
+        jenkins.stop()
+
+    if result == 'SUCCESS':
+        if builds != [('commcare-core-2.6', 1), ('commcare-android-2.6', 1)]:
+            problems.append('expected both builds locked in, got {!r} '
+                            '({})'.format(builds, error))
+        for job in jenkins.jobs.values():
+            build = job['builds'][1]
+            if build['displayName'] != '2.6.0' or not build['keepLog']:
+                problems.append('build not named and kept: {!r}'.format(
+                    build))
+    else:
+        expected = 'builds did not succeed: commcare-core-2.6 #1 ({})'.format(
+            result)
+        if error != expected:
+            problems.append('expected {!r}, got {!r}'.format(expected,
+                                                             error))
+        if elapsed > FAILURE_SECONDS:
+            problems.append('failure took {:.1f}s to report'.format(elapsed))
+    print('{:<8} {:>6.2f}s  {}'.format(result, elapsed,
+                                       'FAIL' if problems else 'ok'))
+    return problems
+
+
+def main():
+    problems = check('SUCCESS') + check('FAILURE')
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+In-process stand-in for the parts of the Jenkins HTTP API the deploy scripts
+use: job and view config.xml, job creation, job and build info, next build
+numbers, triggering builds and the queue, and naming and keeping builds.
+
+Builds finish the moment they're triggered, with the job's result (SUCCESS
+unless add_job says otherwise), and successful ones trigger the jobs listed
+in the job's <childProjects>, so release commands never wait on it.
+Every request is counted.
+
+Like Jenkins, which ignores the parameters of a body that isn't declared a
+form, the form endpoints (nextbuildnumber/submit and a build's configSubmit)
+refuse POSTs without a form Content-Type. Those are
+counted in rejected, since the scripts may carry on after the error.
+"""
+
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+CHILD_PROJECTS_PATTERN = re.compile(r'<childProjects>([^<]*)</childProjects>')
+
+FORM_TYPE = 'application/x-www-form-urlencoded'
+
+CRUMB = {'_class': 'hudson.security.csrf.DefaultCrumbIssuer',
+         'crumbRequestField': 'Jenkins-Crumb',
+         'crumb': 'bench'}
+
+VIEW_TEMPLATE = """<?xml version="1.1" encoding="UTF-8"?>
+<hudson.model.ListView>
+  <name>{name}</name>
+  <filterExecutors>false</filterExecutors>
+  <filterQueue>false</filterQueue>
+  <properties class="hudson.model.View$PropertyList"/>
+  <jobNames>
+    <comparator class="hudson.util.CaseInsensitiveComparator"/>
+{jobs}
+  </jobNames>
+  <recurse>false</recurse>
+</hudson.model.ListView>
+"""
+
+
+class FakeJenkins:
+    def __init__(self):
+        self.jobs = {}
+        self.views = {}
+        self.queue = {}
+        self.requests = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    # String String Integer String -> None
+    def add_job(self, name, config, next_build=1, result='SUCCESS'):
+        self.jobs[name] = {'config': config, 'next_build': next_build,
+                           'builds': {}, 'result': result}
+
+    # String [List-of String] -> None
+    def add_view(self, name, jobs):
+        lines = '\n'.join('    <string>{}</string>'.format(job)
+                          for job in sorted(jobs, key=str.lower))
+        self.views[name] = VIEW_TEMPLATE.format(name=name, jobs=lines)
+
+    # None -> String
+    def start(self):
+        """
+        Serve on a free local port, returning the server's URL.
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler_for(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+
+    # None -> None
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    # String String Bytes [Maybe String] -> (Integer, Dict, Bytes)
+    def handle(self, method, url, body, content_type=None):
+        parts = urlsplit(url)
+        path = [unquote(p) for p in parts.path.strip('/').split('/')]
+        query = parse_qs(parts.query)
+        with self.lock:
+            self.requests += 1
+            if path == ['crumbIssuer', 'api', 'json']:
+                return json_response(CRUMB)
+            if path == ['createItem'] and method == 'POST':
+                return self.create_job(query['name'][0], body)
+            if path[0] == 'view' and path[2:] == ['config.xml']:
+                return self.view_config(method, path[1], body)
+            if len(path) >= 3 and path[0] == 'queue' and path[1] == 'item':
+                return self.queue_item(int(path[2]))
+            if len(path) >= 3 and path[0] == 'job':
+                return self.job_request(method, path[1], path[2:], body,
+                                        content_type)
+            return not_found()
+
+    # String Bytes -> (Integer, Dict, Bytes)
+    def create_job(self, name, body):
+        if name in self.jobs:
+            return 400, {}, b'job already exists'
+        self.add_job(name, body.decode('utf-8'))
+        return 200, {}, b''
+
+    # String String Bytes -> (Integer, Dict, Bytes)
+    def view_config(self, method, name, body):
+        if name not in self.views:
+            return not_found()
+        if method == 'POST':
+            self.views[name] = body.decode('utf-8')
+            return 200, {}, b''
+        return 200, {}, self.views[name].encode('utf-8')
+
+    # Integer -> (Integer, Dict, Bytes)
+    def queue_item(self, item_id):
+        if item_id not in self.queue:
+            return not_found()
+        job_name, number = self.queue[item_id]
+        return json_response({'id': item_id, 'cancelled': False,
+                              'task': {'name': job_name},
+                              'executable': {'number': number}})
+
+    # String String [List-of String] Bytes [Maybe String]
+    #   -> (Integer, Dict, Bytes)
+    def job_request(self, method, name, rest, body, content_type):
+        job = self.jobs.get(name)
+        if job is None:
+            return not_found()
+
+        if rest == ['config.xml']:
+            if method == 'POST':
+                job['config'] = body.decode('utf-8')
+                return 200, {}, b''
+            return 200, {}, job['config'].encode('utf-8')
+        if rest == ['api', 'json']:
+            builds = sorted(job['builds'].values(),
+                            key=lambda b: b['number'], reverse=True)
+            return json_response({'name': name,
+                                  'nextBuildNumber': job['next_build'],
+                                  'builds': builds})
+        if rest == ['nextbuildnumber', 'submit'] and method == 'POST':
+            if not is_form(content_type):
+                return self.reject(content_type)
+            form = parse_qs(body.decode('utf-8'))
+            job['next_build'] = int(form['nextBuildNumber'][0])
+            return 200, {}, b''
+        if rest == ['build'] and method == 'POST':
+            item_id = len(self.queue) + 1
+            self.queue[item_id] = (name, self.start_build(name, None))
+            location = 'http://127.0.0.1/queue/item/{}/'.format(item_id)
+            return 201, {'Location': location}, b''
+
+        if rest and rest[0].isdigit():
+            build = job['builds'].get(int(rest[0]))
+            if build is None:
+                return not_found()
+            if rest[1:] == ['api', 'json']:
+                return json_response(build)
+            if rest[1:] == ['configSubmit'] and method == 'POST':
+                if not is_form(content_type):
+                    return self.reject(content_type)
+                form = json.loads(parse_qs(body.decode('utf-8'))['json'][0])
+                build['displayName'] = form['displayName']
+                build['description'] = form['description']
+                return 200, {}, b''
+            if rest[1:] == ['toggleLogKeep'] and method == 'POST':
+                build['keepLog'] = not build['keepLog']
+                return 200, {}, b''
+        return not_found()
+
+    # [Maybe String] -> (Integer, Dict, Bytes)
+    def reject(self, content_type):
+        self.rejected += 1
+        return 400, {}, 'not a form: {}'.format(content_type).encode('utf-8')
+
+    # String [Maybe Dict] -> Integer
+    def start_build(self, name, cause):
+        job = self.jobs[name]
+        number = job['next_build']
+        job['next_build'] += 1
+        job['builds'][number] = {
+            'number': number, 'building': False, 'result': job['result'],
+            'keepLog': False, 'displayName': '#{}'.format(number),
+            'description': 'built by {} #{}'.format(name, number),
+            'timestamp': 0, 'estimatedDuration': 0,
+            'actions': [{'causes': [cause]}] if cause else [{}]}
+        if job['result'] != 'SUCCESS':
+            # Jenkins only triggers downstream jobs after a stable build
+            return number
+        for child in child_projects(job['config']):
+            if child in self.jobs:
+                self.start_build(child, {'upstreamProject': name,
+                                         'upstreamBuild': number})
+        return number
+
+
+# String -> [List-of String]
+def child_projects(config):
+    children = []
+    for names in CHILD_PROJECTS_PATTERN.findall(config):
+        children.extend(n.strip() for n in names.split(',') if n.strip())
+    return children
+
+
+# [Maybe String] -> Boolean
+def is_form(content_type):
+    return (content_type or '').split(';')[0].strip().lower() == FORM_TYPE
+
+
+# Dict -> (Integer, Dict, Bytes)
+def json_response(data):
+    return (200, {'Content-Type': 'application/json'},
+            json.dumps(data).encode('utf-8'))
+
+
+# None -> (Integer, Dict, Bytes)
+def not_found():
+    return 404, {}, b'Not Found'
+
+
+# FakeJenkins -> Class
+def handler_for(jenkins):
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive, like the real thing
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def respond(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            status, headers, payload = jenkins.handle(
+                method, self.path, body, self.headers.get('Content-Type'))
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self.respond('GET')
+
+        def do_POST(self):
+            self.respond('POST')
+
+    return Handler
@@ -0,0 +1,248 @@
+"""
+Generated stand-ins for the repositories and Jenkins jobs a release works on.
+
+create_remotes builds bare commcare-core, commcare-android and
+commcare-translations repos with a history of `releases` past 2.Y releases,
+each with a commcare_2.Y release branch and `hotfixes` commcare_2.Y.Z tags,
+and clones them into a BASE_DIR. seed_jenkins fills a FakeJenkins with the
+master and release jobs and the mobile views for the same history, so the
+next release is 2.<releases + 1>.
+"""
+
+import os
+import subprocess
+
+MAJOR = 2
+REPOS = ['commcare-core', 'commcare-android', 'commcare-translations']
+# repos with release branches and tags
+RELEASE_REPOS = ['commcare-core', 'commcare-android']
+BRANCH_BASE = 'commcare_'
+
+MOBILE_VIEW_NAME = "CommCare Mobile"
+ARCHIVED_MOBILE_VIEW_NAME = "CommCare Mobile Archive"
+
+# strings in the generated strings.xml and translatable strings file
+STRING_COUNT = 200
+
+CONFIG_ENGINE_PATH = 'src/cli/java/org/commcare/util/engine/' \
+    'CommCareConfigEngine.java'
+TRANSLATIONS_DIR = 'historical-translations-by-version'
+TRANSLATIONS_FILE = 'messages_en-2.txt'
+
+JOB_TEMPLATE = """<?xml version='1.1' encoding='UTF-8'?>
+<project>
+  <description>{name}</description>
+  <properties>
+    <EnvInjectJobProperty>
+      <info>
+        <propertiesContent>{properties}</propertiesContent>
+      </info>
+    </EnvInjectJobProperty>
+  </properties>
+  <scm class="hudson.plugins.git.GitSCM">
+    <userRemoteConfigs>
+      <hudson.plugins.git.UserRemoteConfig>
+        <url>git@github.com:dimagi/{repo}.git</url>
+      </hudson.plugins.git.UserRemoteConfig>
+    </userRemoteConfigs>
+    <branches>
+      <hudson.plugins.git.BranchSpec>
+        <name>{ref}</name>
+      </hudson.plugins.git.BranchSpec>
+    </branches>
+  </scm>
+  <publishers>
+    <hudson.tasks.BuildTrigger>
+      <childProjects>{children}</childProjects>
+    </hudson.tasks.BuildTrigger>
+  </publishers>
+</project>
+"""
+
+
+# Integer Integer -> String
+def version(minor, hotfix=None):
+    if hotfix is None:
+        return '{}.{}'.format(MAJOR, minor)
+    return '{}.{}.{}'.format(MAJOR, minor, hotfix)
+
+
+# String Integer [Maybe Integer] -> [Dict-of String (String, String)]
+def repo_files(repo, minor, hotfix=None):
+    """
+    Files in repo at 2.minor: on master when hotfix is None, otherwise on the
+    release branch at 2.minor.hotfix. Maps paths to (mode, contents).
+    """
+    if repo == 'commcare-core':
+        return {
+            'application/build.properties': ('100644', (
+                'app.version={}\n'
+                'commcare.version=v${{app.version}}dev\n').format(
+                    version(minor, hotfix or 0))),
+            CONFIG_ENGINE_PATH: ('100644', (
+                'public class CommCareConfigEngine {{\n'
+                '    public static final int MAJOR_VERSION = {0};\n'
+                '    public static final int MINOR_VERSION = {1};\n'
+                '    platform = new CommCarePlatform({0}, {1});\n'
+                '}}\n').format(MAJOR, minor)),
+        }
+    if repo == 'commcare-android':
+        strings = ''.join(
+            '  <string name="s{0}" cc:translatable="true">'
+            'Text %{1}$s number {0}</string>\n'.format(i, i % 3 + 1)
+            for i in range(STRING_COUNT))
+        locales = ''.join('key.{0}=Message {0}\n'.format(i)
+                          for i in range(STRING_COUNT))
+        return {
+            'app/AndroidManifest.xml': ('100644', (
+                '<manifest xmlns:android='
+                '"http://schemas.android.com/apk/res/android"\n'
+                '    android:versionName="{}">\n</manifest>\n').format(
+                    version(minor, hotfix))),
+            'app/res/values/strings.xml': ('100644', (
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<resources xmlns:cc="http://strings_namespace">\n'
+                '{}</resources>\n').format(strings)),
+            'app/assets/locales/android_translatable_strings.txt':
+                ('100644', locales),
+        }
+    versioned = '{}/{}-{}'.format(TRANSLATIONS_DIR, version(minor),
+                                  TRANSLATIONS_FILE)
+    return {
+        versioned: ('100644', 'release {}\n'.format(version(minor))),
+        TRANSLATIONS_FILE: ('120000', versioned),
+    }
+
+
+# String Integer Integer -> String
+def fast_import_stream(repo, releases, hotfixes):
+    """
+    git fast-import input for the repo's history: a master commit per
+    release, release branches with a commit per hotfix, tags on each, and
+    master at the next release.
+    """
+    commands = []
+    marks = [0]
+
+    def commit(ref, files, message, parent):
+        marks[0] += 1
+        lines = ['commit {}'.format(ref),
+                 'mark :{}'.format(marks[0]),
+                 'committer Bench <bench@example.com> {} +0000'.format(
+                     1500000000 + marks[0] * 60),
+                 data(message)]
+        if parent:
+            lines.append('from :{}'.format(parent))
+        for path, (mode, contents) in sorted(files.items()):
+            lines.append('M {} inline {}'.format(mode, path))
+            lines.append(data(contents))
+        commands.append('\n'.join(lines))
+        return marks[0]
+
+    def reset(ref, mark):
+        commands.append('reset {}\nfrom :{}'.format(ref, mark))
+
+    master = None
+    for minor in range(1, releases + 1):
+        master = commit('refs/heads/master', repo_files(repo, minor),
+                        'Release {}'.format(version(minor)), master)
+        if repo not in RELEASE_REPOS:
+            continue
+        branch = 'refs/heads/{}{}'.format(BRANCH_BASE, version(minor))
+        tip = master
+        for hotfix in range(hotfixes):
+            tip = commit(branch, repo_files(repo, minor, hotfix),
+                         'Hotfix {}'.format(version(minor, hotfix)), tip)
+            reset('refs/tags/{}{}'.format(BRANCH_BASE,
+                                          version(minor, hotfix)), tip)
+    commit('refs/heads/master', repo_files(repo, releases + 1),
+           'Start {}'.format(version(releases + 1)), master)
+    return '\n\n'.join(commands) + '\n\ndone\n'
+
+
+# String -> String
+def data(text):
+    return 'data {}\n{}'.format(len(text.encode('utf-8')), text)
+
+
+# String Integer Integer Dict -> None
+def create_remotes(root, releases, hotfixes, env):
+    """
+    Bare remotes under root/remotes and clones of them under root/base.
+    """
+    for repo in REPOS:
+        remote = os.path.join(root, 'remotes', '{}.git'.format(repo))
+        subprocess.check_call(['git', 'init', '-q', '--bare', remote],
+                              env=env)
+        subprocess.run(['git', 'fast-import', '--quiet'], cwd=remote, env=env,
+                       input=fast_import_stream(repo, releases,
+                                                hotfixes).encode('utf-8'),
+                       check=True)
+        subprocess.check_call(['git', 'clone', '-q', remote,
+                               os.path.join(root, 'base', repo)], env=env)
+
+
+# String String Dict -> None
+def reconcile_release_branch(root, branch, env):
+    """
+    What the release manager does by hand between 'deploy finalize' and the
+    first hotfix: delete the release branch, locally and on the remote.
+    """
+    for repo in RELEASE_REPOS:
+        path = os.path.join(root, 'base', repo)
+        for cmd in (['git', 'checkout', '-q', 'master'],
+                    ['git', 'branch', '-q', '-D', branch],
+                    ['git', 'push', '-q', 'origin', '--delete', branch]):
+            subprocess.run(cmd, cwd=path, env=env, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+
+
+# String String String [List-of String] [List-of String] -> String
+def job_config(name, repo, ref, properties, children):
+    return JOB_TEMPLATE.format(name=name, repo=repo, ref=ref,
+                               properties='\n'.join(properties),
+                               children=', '.join(children))
+
+
+# FakeJenkins Integer Integer -> None
+def seed_jenkins(jenkins, releases, hotfixes):
+    """
+    Master jobs building the next release, a pair of release jobs per past
+    release built off of its last tag, and the mobile views.
+    """
+    next_release = version(releases + 1, 0)
+    jenkins.add_job('commcare-core',
+                    job_config('commcare-core', 'commcare-core',
+                               'refs/heads/master', [], ['commcare-android']),
+                    next_build=5000)
+    jenkins.add_job('commcare-android',
+                    job_config('commcare-android', 'commcare-android',
+                               'refs/heads/master',
+                               ['VERSION={}'.format(next_release)], []),
+                    next_build=9000)
+
+    release_jobs = []
+    for minor in range(1, releases + 1):
+        last_tag = BRANCH_BASE + version(minor, hotfixes - 1)
+        core_job = 'commcare-core-{}'.format(version(minor))
+        android_job = 'commcare-android-{}'.format(version(minor))
+        jenkins.add_job(core_job,
+                        job_config(core_job, 'commcare-core',
+                                   'refs/tags/' + last_tag, [],
+                                   [android_job]),
+                        next_build=100)
+        jenkins.add_job(android_job,
+                        job_config(android_job, 'commcare-android',
+                                   'refs/tags/' + last_tag,
+                                   ['VERSION={}'.format(
+                                       version(minor, hotfixes)),
+                                    'CCCORE_BRANCH={}'.format(last_tag)],
+                                   []),
+                        next_build=100)
+        release_jobs.append([core_job, android_job])
+
+    current = [job for jobs in release_jobs[-2:] for job in jobs]
+    archived = [job for jobs in release_jobs[:-2] for job in jobs]
+    jenkins.add_view(MOBILE_VIEW_NAME,
+                     ['commcare-core', 'commcare-android'] + current)
+    jenkins.add_view(ARCHIVED_MOBILE_VIEW_NAME, archived)
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+"""
+Startup regression check for the deploy and hotfix scripts.
+
+Runs 'help' and an argument error for each script, failing if any of them
+imports a module that only real commands should need, or if their median
+wall time goes over the budget. Time is measured on top of a bare
+interpreter start so slow site setup on a machine doesn't count against the
+scripts.
+
+usage: benchmarks/startup.py [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# milliseconds over a bare 'python -c pass'
+BUDGET_MS = 100
+
+INVOCATIONS = [
+    ['deploy', 'help'],
+    ['deploy'],
+    ['deploy', 'help', 'extra'],
+    ['hotfix', 'help'],
+    ['hotfix'],
+    ['hotfix', 'help', 'extra'],
+]
+
+# modules that must not be imported before a command is dispatched
+HEAVY_MODULES = ['jenkins', 'github3', 'pkg_resources', 'requests',
+                 'jenkins_client', 'jenkins_utils', 'git_utils', 'utils',
+                 'repo_executor', 'update_translations',
+                 'xml.etree.ElementTree']
+
+
+# [List-of String] -> (Float, [Set-of String])
+def run_once(args):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                            cwd=ROOT, env=env, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = (time.perf_counter() - start) * 1000
+    modules = set()
+    for line in result.stderr.decode('utf-8', 'replace').splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return elapsed, modules
+
+
+# [List-of String] Integer -> (Float, [Set-of String])
+def measure(args, runs):
+    times = []
+    modules = set()
+    for _ in range(runs):
+        elapsed, imported = run_once(args)
+        times.append(elapsed)
+        modules |= imported
+    return statistics.median(times), modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    baseline, _ = measure(['-c', 'pass'], runs)
+    print('bare interpreter: {:.1f}ms'.format(baseline))
+
+    failed = False
+    for args in INVOCATIONS:
+        median, modules = measure(args, runs)
+        overhead = median - baseline
+        heavy = sorted(m for m in HEAVY_MODULES if m in modules)
+        status = 'ok'
+        if heavy or overhead > BUDGET_MS:
+            status = 'FAIL'
+            failed = True
+        print('{:<24} {:>7.1f}ms (+{:.1f}ms) {}{}'.format(
+            ' '.join(args), median, overhead, status,
+            ' imports {}'.format(', '.join(heavy)) if heavy else ''))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
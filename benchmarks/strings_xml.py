@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+"""
+Memory and time check for the strings.xml converter in update_translations.
+
+Writes a synthetic strings.xml with the given number of strings (100000 by
+default), and a tenth as many, mixing placeholders, escapes and quoted text,
+then streams each through iter_strings_lines from disk. Fails if the larger
+file's peak memory is more than MEMORY_GROWTH times the smaller's: the
+converter's own memory should stay flat as the string catalogue grows. A
+full ElementTree parse of the larger file is measured alongside for
+comparison.
+
+This measures the converter reading a file. update_translations reads
+strings.xml out of git whole, so there the file's size is held in memory
+regardless; what stays flat is the parse on top of it.
+
+usage: benchmarks/strings_xml.py [--strings N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import update_translations  # noqa: E402
+
+DEFAULT_STRINGS = 100000
+# how much more peak memory ten times the strings may take
+MEMORY_GROWTH = 2.0
+
+VALUES = [
+    'Plain text for string {0}',
+    'Sync %s of %s forms for {0}',
+    'Form %2$s of %1$s, entry {0}',
+    "Can\\'t reach \\\"{0}\\\" right now",
+    'Email support\\@example.com about {0}\\?',
+    '"  Keep   spacing\n  for {0} "',
+    'Wrapped\n    across lines {0}\\n',
+]
+
+
+# String Integer -> None
+def write_strings_xml(path, count):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<resources xmlns:cc="http://strings_namespace">\n')
+        for i in range(count):
+            translatable = 'false' if i % 10 == 0 else 'true'
+            value = VALUES[i % len(VALUES)].format(i)
+            f.write('  <string name="s{}" cc:translatable="{}">{}</string>\n'
+                    .format(i, translatable, value.replace('&', '&amp;')
+                            .replace('<', '&lt;')))
+        f.write('</resources>\n')
+
+
+# (-> Any) -> (Any, Float, Integer)
+def measure(func):
+    """
+    func's result, wall time in ms and peak traced memory in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+# String -> Integer
+def stream_lines(path):
+    with open(path, 'rb') as f:
+        return sum(1 for _ in update_translations.iter_strings_lines(f))
+
+
+# String -> Integer
+def parse_tree(path):
+    return len(ET.parse(path).getroot())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check the strings.xml converter\'s memory and speed.')
+    parser.add_argument('--strings', type=int, default=DEFAULT_STRINGS,
+                        help='strings in the larger generated file')
+    count = parser.parse_args().strings
+
+    with tempfile.TemporaryDirectory(prefix='strings-xml-') as tmp:
+        peaks = []
+        for size in [max(count // 10, 1), count]:
+            path = os.path.join(tmp, 'strings-{}.xml'.format(size))
+            write_strings_xml(path, size)
+            lines, elapsed, peak = measure(lambda: stream_lines(path))
+            peaks.append(peak)
+            print('{:>7} strings  stream {:>8.1f}ms {:>8.1f}KiB peak '
+                  '({} lines, {:.1f}MiB file)'.format(
+                      size, elapsed, peak / 1024, lines,
+                      os.path.getsize(path) / 1024 / 1024))
+
+        _, elapsed, peak = measure(lambda: parse_tree(path))
+        print('{:>7} strings  tree   {:>8.1f}ms {:>8.1f}KiB peak'.format(
+            count, elapsed, peak / 1024))
+
+    growth = peaks[1] / peaks[0]
+    print('stream memory growth: {:.2f}x (limit {:.1f}x)'.format(
+        growth, MEMORY_GROWTH))
+    sys.exit(1 if growth > MEMORY_GROWTH else 0)
+
+
+if __name__ == "__main__":
+    main()
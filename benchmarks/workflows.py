@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+
+"""
+Offline end-to-end timings for the deploy and hotfix commands.
+
+For each size, generates local remotes for commcare-core, commcare-android
+and commcare-translations with that many past releases (see fixtures.py),
+starts a fake Jenkins seeded with the matching jobs and views, then runs a
+full release and hotfix cycle against them:
+
+    deploy create, release, finalize
+    hotfix create, resume, release, finalize
+
+Every prompt is answered yes. Each command is reported with its wall time,
+the git processes it started and the HTTP requests Jenkins served. A command
+fails if it exits with an error or sends Jenkins a malformed form POST.
+
+--save writes the results as JSON. --compare checks them against a saved
+run and fails if a command now makes more git calls or Jenkins requests, or
+got more than TIME_TOLERANCE slower.
+
+usage: benchmarks/workflows.py [--sizes 5,50,200] [--hotfixes N]
+                               [--save FILE] [--compare FILE]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_jenkins
+import fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = [5, 50, 200]
+DEFAULT_HOTFIXES = 3
+# fraction a command's wall time may grow by before --compare fails
+TIME_TOLERANCE = 0.5
+
+YES = 'y\n' * 20
+
+GIT_WRAPPER = """#!/bin/sh
+echo "$*" >> "$BENCH_GIT_LOG"
+exec "{git}" "$@"
+"""
+
+GITCONFIG = """[user]
+    name = Bench
+    email = bench@example.com
+[init]
+    defaultBranch = master
+[pull]
+    rebase = false
+[advice]
+    detachedHead = false
+"""
+
+DEPLOY_CONF = """[Jenkins]
+url: {url}
+user: bench
+password: bench
+
+[Local]
+dimagi_projects_dir: {base}
+"""
+
+
+# Integer -> [List-of (String, String, String, [Maybe Function])]
+def workflows(releases):
+    """
+    (script, command, answers, preparation) for each step of the cycle.
+    """
+    release_branch = '{}{}'.format(fixtures.BRANCH_BASE,
+                                   fixtures.version(releases + 1))
+    hotfix_repos = ' '.join(fixtures.RELEASE_REPOS)
+
+    def reconcile(root, env):
+        fixtures.reconcile_release_branch(root, release_branch, env)
+
+    return [
+        ('deploy', 'create', YES, None),
+        ('deploy', 'release', YES, None),
+        ('deploy', 'finalize', YES, None),
+        ('hotfix', 'create', 'y\n{}\n'.format(hotfix_repos) + YES,
+         reconcile),
+        ('hotfix', 'resume', YES, None),
+        ('hotfix', 'release', YES, None),
+        ('hotfix', 'finalize', YES, None),
+    ]
+
+
+# String -> Dict
+def make_environment(root, url):
+    """
+    Config, git wrapper and environment for running the scripts against the
+    fixtures under root.
+    """
+    bin_dir = os.path.join(root, 'bin')
+    os.makedirs(bin_dir)
+    wrapper = os.path.join(bin_dir, 'git')
+    with open(wrapper, 'w') as f:
+        f.write(GIT_WRAPPER.format(git=shutil.which('git')))
+    os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IEXEC)
+
+    gitconfig = os.path.join(root, 'gitconfig')
+    with open(gitconfig, 'w') as f:
+        f.write(GITCONFIG)
+
+    conf = os.path.join(root, 'deploy.conf')
+    with open(conf, 'w') as f:
+        f.write(DEPLOY_CONF.format(url=url, base=os.path.join(root, 'base')))
+
+    home = os.path.join(root, 'home')
+    os.makedirs(home)
+    env = dict(os.environ,
+               HOME=home,
+               PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''),
+               GIT_CONFIG_GLOBAL=gitconfig,
+               GIT_CONFIG_NOSYSTEM='1',
+               GIT_TERMINAL_PROMPT='0',
+               DEPLOY_CONF=conf,
+               BENCH_GIT_LOG=os.path.join(root, 'git.log'),
+               PYTHONDONTWRITEBYTECODE='1')
+    for name in ('GIT_AUTHOR_NAME', 'GIT_AUTHOR_EMAIL', 'GIT_COMMITTER_NAME',
+                 'GIT_COMMITTER_EMAIL', 'GIT_DIR', 'GIT_WORK_TREE'):
+        env.pop(name, None)
+    return env
+
+
+# String -> Integer
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+# String String String Dict FakeJenkins String -> Dict
+def run_command(script, command, answers, env, jenkins, cwd):
+    git_before = count_lines(env['BENCH_GIT_LOG'])
+    http_before = jenkins.requests
+    rejected_before = jenkins.rejected
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(ROOT, script),
+                             command],
+                            cwd=cwd, env=env, input=answers.encode('utf-8'),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    elapsed = (time.perf_counter() - start) * 1000
+    output = result.stdout.decode('utf-8', 'replace')
+    return {'command': '{} {}'.format(script, command),
+            'ms': round(elapsed, 1),
+            'git': count_lines(env['BENCH_GIT_LOG']) - git_before,
+            'http': jenkins.requests - http_before,
+            'ok': (result.returncode == 0 and 'Traceback' not in output and
+                   jenkins.rejected == rejected_before),
+            'output': output}
+
+
+# Integer Integer -> [List-of Dict]
+def run_size(releases, hotfixes):
+    root = tempfile.mkdtemp(prefix='mobile-deploy-bench-')
+    jenkins = fake_jenkins.FakeJenkins()
+    try:
+        fixtures.seed_jenkins(jenkins, releases, hotfixes)
+        env = make_environment(root, jenkins.start())
+        fixtures.create_remotes(root, releases, hotfixes, env)
+        work_dir = os.path.join(root, 'work')
+        os.makedirs(work_dir)
+
+        results = []
+        for script, command, answers, prepare in workflows(releases):
+            if prepare is not None:
+                prepare(root, env)
+            result = run_command(script, command, answers, env, jenkins,
+                                 work_dir)
+            result['size'] = releases
+            results.append(result)
+            if not result['ok']:
+                # later steps build on this one
+                break
+        return results
+    finally:
+        jenkins.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+# [List-of Dict] [List-of Dict] -> [List-of String]
+def regressions(results, baseline):
+    previous = dict(((r['size'], r['command']), r) for r in baseline)
+    problems = []
+    for result in results:
+        before = previous.get((result['size'], result['command']))
+        if before is None:
+            continue
+        label = '{} ({} releases)'.format(result['command'], result['size'])
+        for key in ('git', 'http'):
+            if result[key] > before[key]:
+                problems.append('{}: {} {} -> {}'.format(label, key,
+                                                         before[key],
+                                                         result[key]))
+        if result['ms'] > before['ms'] * (1 + TIME_TOLERANCE):
+            problems.append('{}: {:.0f}ms -> {:.0f}ms'.format(
+                label, before['ms'], result['ms']))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the release workflows against local fixtures.')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated numbers of past releases')
+    parser.add_argument('--hotfixes', type=int, default=DEFAULT_HOTFIXES,
+                        help='hotfix tags per past release')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results to check against')
+    args = parser.parse_args()
+
+    failed = False
+    results = []
+    print('{:>8} {:<18} {:>10} {:>6} {:>6}'.format('releases', 'command',
+                                                   'wall', 'git', 'http'))
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for result in run_size(size, args.hotfixes):
+            results.append(result)
+            print('{:>8} {:<18} {:>8.0f}ms {:>6} {:>6}{}'.format(
+                size, result['command'], result['ms'], result['git'],
+                result['http'], '' if result['ok'] else ' FAIL'))
+            if not result['ok']:
+                failed = True
+                print(result['output'])
+
+    for result in results:
+        del result['output']
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = regressions(results, json.load(f))
+        for problem in problems:
+            print('REGRESSION {}'.format(problem))
+        failed = failed or bool(problems)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
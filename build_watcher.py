@@ -0,0 +1,276 @@
+"""
+Trigger a Jenkins release build, follow it (and the build it triggers
+downstream) to completion, then name the builds after the CommCare version
+and mark them 'keep this build forever'.
+
+Polling backs off while a build is running and sleeps no longer than the
+build's estimated remaining time, so short builds are noticed promptly and
+long ones aren't hammered.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+from urllib.request import Request
+
+MIN_POLL_SECONDS = 2
+MAX_POLL_SECONDS = 60
+BACKOFF_FACTOR = 1.5
+# how long to wait for a queued build to start, and for a build to finish
+QUEUE_TIMEOUT_SECONDS = 30 * 60
+BUILD_TIMEOUT_SECONDS = 90 * 60
+
+BUILD_TREE = ('number,building,result,keepLog,displayName,description,'
+              'timestamp,estimatedDuration')
+DOWNSTREAM_TREE = ('builds[number,actions[causes[upstreamProject,'
+                   'upstreamBuild]]]')
+
+
+class BuildWatchError(Exception):
+    pass
+
+
+class Backoff:
+    """
+    Poll delays that grow geometrically from MIN_POLL_SECONDS to
+    MAX_POLL_SECONDS. A hint (e.g. time left on a build) caps the delay.
+    """
+
+    def __init__(self, minimum=MIN_POLL_SECONDS, maximum=MAX_POLL_SECONDS,
+                 factor=BACKOFF_FACTOR):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = minimum
+
+    # [Maybe Number] -> Number
+    def next_delay(self, hint=None):
+        delay = self.delay
+        self.delay = min(self.maximum, self.delay * self.factor)
+        if hint is not None:
+            delay = max(self.minimum, min(delay, hint))
+        return delay
+
+
+class BuildWatcher:
+    """
+    sleep(seconds), if given, is called between polls. By default a poll
+    that can be stopped waits on its stop event instead, so stopping it
+    takes effect at once.
+    """
+
+    def __init__(self, client, sleep=None, clock=time.time):
+        self.client = client
+        self.sleep = sleep
+        self.clock = clock
+        self.print_lock = threading.Lock()
+
+    # String -> None
+    def log(self, msg):
+        with self.print_lock:
+            print(msg)
+
+    # Number [Maybe Event] -> None
+    def pause(self, seconds, stop=None):
+        if self.sleep is not None:
+            self.sleep(seconds)
+        elif stop is not None:
+            stop.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    # String -> Dict
+    def get_json(self, path):
+        return json.loads(self.client.jenkins_open(
+            Request(self.client.server + path)))
+
+    # String [Maybe Dict] -> Response
+    def post(self, path, form=None):
+        data = urlencode(form).encode('utf-8') if form else b''
+        # the client declares the body a form
+        return self.client.open_request(Request(self.client.server + path,
+                                                data))
+
+    # String -> Integer
+    def trigger(self, job_name):
+        """
+        Start a build of job_name and return its queue item id.
+        """
+        response = self.post('{}build'.format(job_path(job_name)))
+        location = response.headers.get('location', '')
+        queue_id = location.rstrip('/').rsplit('/', 1)[-1]
+        if '/queue/item/' not in location or not queue_id.isdigit():
+            raise BuildWatchError("Jenkins didn't return a queue item for "
+                                  "{} (Location: {!r})".format(job_name,
+                                                               location))
+        self.log('{} queued as item {}'.format(job_name, queue_id))
+        return int(queue_id)
+
+    # String Integer -> Integer
+    def wait_for_queue_item(self, job_name, queue_id):
+        """
+        Follow a queue item until it becomes a build, returning the build
+        number.
+        """
+        backoff = Backoff()
+        deadline = self.clock() + QUEUE_TIMEOUT_SECONDS
+        while True:
+            item = self.get_json('queue/item/{}/api/json'.format(queue_id))
+            if item.get('cancelled'):
+                raise BuildWatchError('{} queue item {} was '
+                                      'cancelled'.format(job_name, queue_id))
+            executable = item.get('executable')
+            if executable and executable.get('number') is not None:
+                number = executable['number']
+                self.log('{} #{} started'.format(job_name, number))
+                return number
+            if self.clock() > deadline:
+                raise BuildWatchError('{} is still queued after {}s'.format(
+                    job_name, QUEUE_TIMEOUT_SECONDS))
+            self.pause(backoff.next_delay())
+
+    # String Integer -> Dict
+    def wait_for_build(self, job_name, number):
+        """
+        Poll a build until it finishes, returning its final info.
+        """
+        backoff = Backoff()
+        deadline = self.clock() + BUILD_TIMEOUT_SECONDS
+        path = '{}{}/api/json?tree={}'.format(job_path(job_name), number,
+                                              BUILD_TREE)
+        while True:
+            info = self.get_json(path)
+            if not info.get('building') and info.get('result'):
+                self.log('{} #{} finished: {}'.format(job_name, number,
+                                                      info['result']))
+                return info
+            if self.clock() > deadline:
+                raise BuildWatchError('{} #{} is still running after '
+                                      '{}s'.format(job_name, number,
+                                                   BUILD_TIMEOUT_SECONDS))
+            self.pause(backoff.next_delay(remaining_seconds(info,
+                                                            self.clock())))
+
+    # String String Integer [Maybe Event] -> Integer
+    def find_downstream_build(self, job_name, upstream_job, upstream_number,
+                              stop=None):
+        """
+        Wait for the build of job_name caused by upstream_job
+        #upstream_number to appear and return its number. Setting stop
+        gives up waiting.
+        """
+        backoff = Backoff()
+        deadline = self.clock() + QUEUE_TIMEOUT_SECONDS + BUILD_TIMEOUT_SECONDS
+        path = '{}api/json?tree={}'.format(job_path(job_name),
+                                           DOWNSTREAM_TREE)
+        while True:
+            for build in self.get_json(path).get('builds', []):
+                if caused_by(build, upstream_job, upstream_number):
+                    self.log('{} #{} started by {} #{}'.format(
+                        job_name, build['number'], upstream_job,
+                        upstream_number))
+                    return build['number']
+            if self.clock() > deadline:
+                raise BuildWatchError('no {} build was started by {} '
+                                      '#{}'.format(job_name, upstream_job,
+                                                   upstream_number))
+            self.pause(backoff.next_delay(), stop)
+            if stop is not None and stop.is_set():
+                raise BuildWatchError('stopped waiting for a {} build '
+                                      'started by {} #{}'.format(
+                                          job_name, upstream_job,
+                                          upstream_number))
+
+    # String Integer String -> None
+    def name_and_keep(self, job_name, number, display_name):
+        info = self.get_json('{}{}/api/json?tree={}'.format(
+            job_path(job_name), number, BUILD_TREE))
+        build_path = '{}{}/'.format(job_path(job_name), number)
+        if info.get('displayName') != display_name:
+            # configSubmit sets both; send the description back unchanged
+            self.post(build_path + 'configSubmit',
+                      {'json': json.dumps({
+                          'displayName': display_name,
+                          'description': info.get('description') or ''})})
+        if not info.get('keepLog'):
+            # toggles, so only hit it when the build isn't kept yet
+            self.post(build_path + 'toggleLogKeep')
+        self.log('{} #{} named {} and kept forever'.format(job_name, number,
+                                                           display_name))
+
+    # String String String -> [List-of (String, Integer)]
+    def run(self, job_name, downstream_job_name, display_name):
+        """
+        Trigger job_name, watch it and the downstream_job_name build it
+        causes, and name and keep both once they succeed. Returns the
+        (job, build number) pairs that were locked in.
+        """
+        queue_id = self.trigger(job_name)
+        number = self.wait_for_queue_item(job_name, queue_id)
+
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            upstream = pool.submit(self.wait_for_build, job_name, number)
+            downstream = None
+            if downstream_job_name:
+                downstream = pool.submit(self.watch_downstream,
+                                         downstream_job_name, job_name,
+                                         number, stop)
+            info = upstream.result()
+            if info['result'] != 'SUCCESS':
+                # a failed build doesn't trigger the downstream one; stop
+                # waiting for it and report the failure now
+                stop.set()
+                raise BuildWatchError('builds did not succeed: {} #{} '
+                                      '({})'.format(job_name, number,
+                                                    info['result']))
+            builds = [(job_name, number, info)]
+            if downstream is not None:
+                builds.append((downstream_job_name,) + downstream.result())
+
+        failed = ['{} #{} ({})'.format(job, n, info['result'])
+                  for job, n, info in builds if info['result'] != 'SUCCESS']
+        if failed:
+            raise BuildWatchError('builds did not succeed: {}'.format(
+                ', '.join(failed)))
+
+        for job, n, _ in builds:
+            self.name_and_keep(job, n, display_name)
+        return [(job, n) for job, n, _ in builds]
+
+    # String String Integer [Maybe Event] -> (Integer, Dict)
+    def watch_downstream(self, job_name, upstream_job, upstream_number,
+                         stop=None):
+        number = self.find_downstream_build(job_name, upstream_job,
+                                            upstream_number, stop)
+        return number, self.wait_for_build(job_name, number)
+
+
+# String -> String
+def job_path(job_name):
+    return 'job/{}/'.format(quote(job_name))
+
+
+# Dict Number -> [Maybe Number]
+def remaining_seconds(info, now):
+    """
+    Seconds until a running build is expected to finish, from its start time
+    and Jenkins' estimated duration.
+    """
+    started = info.get('timestamp')
+    estimate = info.get('estimatedDuration')
+    if not started or not estimate or estimate < 0:
+        return None
+    return max(0, (started + estimate) / 1000.0 - now)
+
+
+# Dict String Integer -> Boolean
+def caused_by(build, upstream_job, upstream_number):
+    for action in build.get('actions') or []:
+        for cause in (action or {}).get('causes') or []:
+            if (cause.get('upstreamProject') == upstream_job and
+                    cause.get('upstreamBuild') == upstream_number):
+                return True
+    return False
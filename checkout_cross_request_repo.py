@@ -1,80 +1,147 @@
 #!/usr/bin/python3
 
 """
-Checkout target repo with branch noted as cross-request dependency for a given
-pull request of the source repo.
+Checkout target repos with the branches noted as cross-request dependencies
+for a given pull request of the source repo.
+
+A cross-request is a line like 'cross-request: <PR url>' in a PR's
+description. Links in the linked PRs' descriptions are followed as well, so
+a chain of PRs across repos is checked out together.
 """
 
-import github3
 import os
 import re
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import github_client
+import mirror_cache
+from repo_executor import run_in_repos
+
+OWNER = 'dimagi'
+
+# a cross-request link to a PR in one of OWNER's repos: the repo and number
+CROSS_REQUEST_PATTERN = re.compile(
+    r'[Cc]ross-?(?:request)?:?\s?{}([\w.-]+)/pull/(\d+)'.format(
+        re.escape(github_client.html_url(OWNER, ''))))
 
 
-# Repo PR -> String
-def get_cross_branch(target_repo, source_pr):
+# String -> [Dict-of String Integer]
+def cross_requests(body):
     """
-    Get target repo branch name that was labeled as cross-requested in source
-    pull request.
+    Maps each repo with a cross-request link in a PR description to the
+    number of the PR linked, in the order they appear. The first link to a
+    repo wins.
     """
-    url = "{}/pull/(\d+)".format(target_repo.html_url)
-    search_pattern = "[Cc]ross-?(request)?:?(\s?){}".format(url)
-    cross_request_search = re.search(search_pattern, source_pr.body)
-
-    if cross_request_search:
-        pr_number = cross_request_search.group(3)
-        branch_name = target_repo.pull_request(pr_number).head.ref
-        return branch_name
-    else:
-        return source_pr.base.ref
+    links = {}
+    for repo, number in CROSS_REQUEST_PATTERN.findall(body):
+        links.setdefault(repo, int(number))
+    return links
 
 
-# String Integer String String -> None
-def checkout_pr_branch(local_parent_dir, pr_number,
-                       source_repo_name, target_repo_name, github_token):
-    os.chdir(local_parent_dir)
+# GitHubClient String PullRequest -> [Dict-of String String]
+def resolve_cross_branches(github, source_repo_name, source_pr):
+    """
+    Maps the source repo, and every repo cross-requested from it directly
+    or through the PRs it links, to the head branch of its PR. The PRs
+    linked from one level of the chain are looked up at once. Each repo is
+    resolved once, from the link nearest the source PR, which also stops
+    PRs that link each other from being followed in circles.
+    """
+    numbers = {source_repo_name: source_pr.number}
+    branches = {source_repo_name: source_pr.head_ref}
+    level = [source_pr]
+    with ThreadPoolExecutor(max_workers=github_client.POOL_SIZE) as pool:
+        while level:
+            linked = []
+            for pr in level:
+                for repo, number in cross_requests(pr.body).items():
+                    if repo not in numbers:
+                        numbers[repo] = number
+                        linked.append(repo)
+                    elif numbers[repo] != number:
+                        print("Ignoring cross-request to {} #{} from #{}; "
+                              "using #{}".format(repo, number, pr.number,
+                                                 numbers[repo]))
+            level = list(pool.map(
+                lambda repo: github.pull_request(OWNER, repo, numbers[repo]),
+                linked))
+            for repo, pr in zip(linked, level):
+                branches[repo] = pr.head_ref
+    return branches
+
+
+# String Integer String [List-of String] String Boolean -> None
+def checkout_pr_branches(local_parent_dir, pr_number, source_repo_name,
+                         target_repo_names, github_token, partial=False):
+    """
+    Check out the source PR's branch and each target repo's cross-requested
+    branch, or the source PR's base branch for a target it doesn't reach,
+    all repos at once. A repo that isn't checked out yet is cloned through
+    its local mirror (see mirror_cache), as a partial clone if partial is
+    set.
+    """
+    # authenticated if a GitHub token is provided
+    github = github_client.GitHubClient(github_token)
 
-    github = github3
+    src_pr = github.pull_request(OWNER, source_repo_name, pr_number)
+    cross_branches = resolve_cross_branches(github, source_repo_name, src_pr)
 
-    # Authenticate if a GitHub token is provided
-    if github_token:
-        github = github3.login(token = github_token)
+    repos = [source_repo_name] + [repo for repo in target_repo_names
+                                  if repo != source_repo_name]
+    branches = dict((repo, cross_branches.get(repo, src_pr.base_ref))
+                    for repo in repos)
 
-    src_repo = github.repository('dimagi', source_repo_name)
-    target_repo = github.repository('dimagi', target_repo_name)
+    def checkout(task):
+        checkout_repo(task, branches[task.repo], partial)
 
-    src_pr = src_repo.pull_request(pr_number)
-    checkout_branch(src_repo.name, src_pr.head.ref)
-    cross_branch = get_cross_branch(target_repo, src_pr)
+    run_in_repos(checkout, repos, base_dir=local_parent_dir)
 
-    if not os.path.exists(target_repo.name):
-        print("Checking out {} for {}".format(cross_branch, target_repo_name))
-        subprocess.call('git clone {}'.format(target_repo.clone_url),
-                        shell=True)
 
-    checkout_branch(target_repo.name, cross_branch)
-    os.chdir(local_parent_dir)
+# RepoTask String Boolean -> None
+def checkout_repo(task, branch, partial=False):
+    if os.path.exists(task.path):
+        checkout_branch(task, branch)
+    else:
+        task.log("Checking out {} for {}".format(branch, task.repo))
+        mirror_cache.clone(OWNER, task.repo, branch, task.path, partial)
+        # the clone has just fetched the branch
+        checkout_branch(task, branch, fetch=False)
 
 
-# String String -> None
-def checkout_branch(repo_name, branch):
-    os.chdir(repo_name)
-    subprocess.call('git fetch', shell=True)
-    subprocess.call('git checkout {}'.format(branch), shell=True)
-    subprocess.call('git pull', shell=True)
-    os.chdir("../")
+# RepoTask String Boolean -> None
+def checkout_branch(task, branch, fetch=True):
+    """
+    Check out origin's branch in the repo, fetching only that branch. The
+    local branch is reset to origin's, since PR branches are often rebased
+    or force-pushed between builds.
+    """
+    if fetch:
+        task.git(['fetch', '--no-tags', 'origin',
+                  '+refs/heads/{0}:refs/remotes/origin/{0}'.format(branch)])
+    task.git(['checkout', '-B', branch,
+              'refs/remotes/origin/{}'.format(branch)])
 
 
 def main():
+    if '--trace' in sys.argv:
+        sys.argv.remove('--trace')
+        import tracing
+        tracing.enable(tracing.default_path('checkout_cross_request_repo'))
+
+    partial = '--partial' in sys.argv
+    if partial:
+        sys.argv.remove('--partial')
+
     if len(sys.argv) < 4:
         print("Command arg format: [source repo] [PR number]" +
-              " [target repo] [OPTIONAL root dir] [OPTIONAL github token]")
+              " [target repo(s), comma separated] [OPTIONAL root dir]" +
+              " [OPTIONAL github token] [OPTIONAL --partial]")
         sys.exit()
 
     source_repo_name = sys.argv[1]
     pr_number = int(sys.argv[2])
-    target_repo_name = sys.argv[3]
+    target_repo_names = sys.argv[3].split(',')
 
     root_dir = "."
     if len(sys.argv) >= 5:
@@ -85,7 +152,8 @@ def main():
     if len(sys.argv) == 6:
         github_token = sys.argv[5]
 
-    checkout_pr_branch(root_dir, pr_number, source_repo_name, target_repo_name, github_token)
+    checkout_pr_branches(root_dir, pr_number, source_repo_name,
+                         target_repo_names, github_token, partial)
 
 
 if __name__ == "__main__":
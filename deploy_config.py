@@ -1,13 +1,45 @@
+import os
 from configparser import ConfigParser
 
-config = ConfigParser()
-config.read("deploy.conf")
+# deploy.conf next to the scripts, unless DEPLOY_CONF points elsewhere
+CONFIG_FILE = os.environ.get(
+    'DEPLOY_CONF',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deploy.conf'))
 
-JENKINS_USER = config.get('Jenkins', 'user')
-JENKINS_PASSWORD = config.get('Jenkins', 'password')
-
-BASE_DIR = config.get('Local', 'dimagi_projects_dir')
+# where the scripts keep state between runs
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mobile-deploy')
 
 REPOS = ['commcare-core', 'commcare-android']
 
 BRANCH_BASE = "commcare_"
+
+# Settings read from deploy.conf on first access, so commands that never use
+# them don't need the file:
+# name -> (section, option, fallback)
+CONFIG_SETTINGS = {
+    'JENKINS_URL': ('Jenkins', 'url', 'https://jenkins.dimagi.com'),
+    'JENKINS_USER': ('Jenkins', 'user', None),
+    'JENKINS_PASSWORD': ('Jenkins', 'password', None),
+    'BASE_DIR': ('Local', 'dimagi_projects_dir', None),
+}
+
+config = None
+
+
+# None -> ConfigParser
+def get_config():
+    global config
+    if config is None:
+        config = ConfigParser()
+        config.read(CONFIG_FILE)
+    return config
+
+
+def __getattr__(name):
+    if name not in CONFIG_SETTINGS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
+    section, option, fallback = CONFIG_SETTINGS[name]
+    if fallback is None:
+        return get_config().get(section, option)
+    return get_config().get(section, option, fallback=fallback)
@@ -5,13 +5,13 @@ Gets url to the latest released apk of CommCare, as listed on
 https://github.com/dimagi/commcare-android/releases
 """
 
-import github3
+from github_client import GitHubClient
 
 
 def main():
-    repo = github3.repository('dimagi', 'commcare-android')
-    latest_release = repo.latest_release()
-    apk_assets = [a for a in latest_release.assets() if is_release_apk(a.name)]
+    latest_release = GitHubClient().latest_release('dimagi',
+                                                   'commcare-android')
+    apk_assets = [a for a in latest_release.assets if is_release_apk(a.name)]
     print(apk_assets[0].browser_download_url)
 
 
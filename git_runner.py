@@ -0,0 +1,273 @@
+"""
+Run git with argument lists instead of shell command strings, and parse what
+it prints in Python.
+
+Arguments go straight to git, so branch, tag and commit message text is never
+seen by a shell. A command that exits nonzero raises a GitError, or the
+subclass matching git's message so callers can handle the failures they
+expect (a branch that already exists, a rejected push) and let the rest
+stop the command.
+
+read_file, commit_files and advance_branch edit a branch through git objects
+and a temporary index, without checking it out.
+"""
+
+import os
+import subprocess
+import tempfile
+from collections import namedtuple
+
+GitResult = namedtuple('GitResult', ['stdout', 'stderr'])
+StatusEntry = namedtuple('StatusEntry', ['code', 'path'])
+
+
+class GitError(Exception):
+    """
+    A git command exited nonzero. output is what it printed, stderr first.
+    """
+
+    def __init__(self, args, returncode, output):
+        self.command = ['git'] + list(args)
+        self.returncode = returncode
+        self.output = output
+        super().__init__('{} failed ({}): {}'.format(
+            ' '.join(self.command), returncode, output.strip()))
+
+
+class UnknownRefError(GitError):
+    pass
+
+
+class RefExistsError(GitError):
+    pass
+
+
+class BranchCheckedOutError(GitError):
+    pass
+
+
+class PushRejectedError(GitError):
+    pass
+
+
+class BranchNotMergedError(GitError):
+    pass
+
+
+class NothingToCommitError(GitError):
+    pass
+
+
+class ConflictError(GitError):
+    pass
+
+
+# message fragments identifying each kind of failure, checked in order
+ERROR_TYPES = [
+    (BranchNotMergedError, ['is not fully merged']),
+    (BranchCheckedOutError, ['checked out at', 'already used by worktree']),
+    (RefExistsError, ['already exists']),
+    (PushRejectedError, ['[rejected]', 'failed to push some refs']),
+    (NothingToCommitError, ['nothing to commit',
+                            'no changes added to commit']),
+    (ConflictError, ['CONFLICT', 'Automatic merge failed',
+                     'would be overwritten']),
+    (UnknownRefError, ['did not match any', 'unknown revision',
+                       "couldn't find remote ref", 'not a valid object name',
+                       'not a valid ref', "' not found",
+                       'not something we can merge']),
+]
+
+
+# [List-of String] Integer String -> GitError
+def error_for(args, returncode, output):
+    for error_type, fragments in ERROR_TYPES:
+        if any(fragment in output for fragment in fragments):
+            return error_type(args, returncode, output)
+    return GitError(args, returncode, output)
+
+
+# [List-of String] [Maybe String] [Maybe Bytes] [Maybe Dict] -> GitResult
+def run(args, cwd=None, input=None, env=None):
+    """
+    Run git with args in cwd (the current directory if None), returning its
+    decoded stdout and stderr. env adds to the process's environment.
+    """
+    if env is not None:
+        env = dict(os.environ, **env)
+    result = subprocess.run(['git'] + list(args), cwd=cwd, env=env,
+                            input=input if input is not None else b'',
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout = result.stdout.decode('utf-8', 'surrogateescape')
+    stderr = result.stderr.decode('utf-8', 'replace')
+    if result.returncode != 0:
+        raise error_for(args, result.returncode, stderr + stdout)
+    return GitResult(stdout, stderr)
+
+
+# [List-of String] [Maybe String] [Maybe Bytes] [Maybe Dict] -> String
+def output(args, cwd=None, input=None, env=None):
+    return run(args, cwd, input, env).stdout
+
+
+# [List-of String] [Maybe String] -> String
+def call(args, cwd=None):
+    """
+    Run git and print what it printed, like running it in a terminal.
+    """
+    result = run(args, cwd)
+    text = combined_output(result)
+    if text:
+        print(text)
+    return result.stdout
+
+
+# GitResult -> String
+def combined_output(result):
+    return (result.stdout + result.stderr).rstrip('\n')
+
+
+# String [Maybe String] -> [List-of (String, String)]
+def ls_remote(cwd, remote='origin'):
+    """
+    (sha, ref name) of every branch and tag on the remote. Annotated tags
+    also have a 'refs/tags/name^{}' entry for the commit they point at.
+    """
+    refs = []
+    for line in output(['ls-remote', '--heads', '--tags', remote],
+                       cwd).splitlines():
+        if line.strip():
+            sha, ref = line.split(None, 1)
+            refs.append((sha, ref))
+    return refs
+
+
+# String -> [List-of StatusEntry]
+def status(cwd):
+    """
+    Changed and untracked files, with their two letter porcelain status code
+    ('??' for untracked). Renames are reported under the new path.
+    """
+    entries = []
+    fields = iter(output(['status', '--porcelain', '-z'], cwd).split('\0'))
+    for field in fields:
+        if not field:
+            continue
+        code, path = field[:2], field[3:]
+        if 'R' in code or 'C' in code:
+            # the source path follows as its own field
+            next(fields, None)
+        entries.append(StatusEntry(code, path))
+    return entries
+
+
+# String String -> String
+def rev_parse(cwd, ref):
+    """
+    SHA of the commit ref points at.
+    """
+    args = ['rev-parse', '--verify', '--quiet', '{}^{{commit}}'.format(ref)]
+    try:
+        return output(args, cwd).strip()
+    except GitError as e:
+        raise UnknownRefError(args, e.returncode,
+                              'unknown revision {}'.format(ref))
+
+
+# String String String -> (String, String)
+def read_file(cwd, rev, path):
+    """
+    (mode, contents) of the file at path in rev.
+    """
+    entry = output(['ls-tree', rev, '--', path], cwd)
+    if not entry:
+        raise UnknownRefError(['ls-tree', rev, '--', path], 128,
+                              "{} did not match any file in {}".format(path,
+                                                                      rev))
+    mode, _, sha = entry.split('\t', 1)[0].split()
+    return mode, output(['cat-file', 'blob', sha], cwd)
+
+
+# String [List-of String] -> [List-of (String, String)]
+def cat_files(cwd, objects):
+    """
+    (SHA, contents) of each object, e.g. 'refs/remotes/origin/master:path',
+    all read by one 'git cat-file --batch'. An object that doesn't exist
+    raises UnknownRefError.
+    """
+    args = ['cat-file', '--batch']
+    data = output(args, cwd, input=''.join(obj + '\n' for obj in objects)
+                  .encode('utf-8')).encode('utf-8', 'surrogateescape')
+    results = []
+    position = 0
+    for obj in objects:
+        end = data.index(b'\n', position)
+        # '<sha> <type> <size>', or '<object> missing'
+        fields = data[position:end].decode('utf-8', 'replace').split(' ')
+        if len(fields) != 3 or not fields[2].isdigit():
+            raise UnknownRefError(args, 128, '{} not found'.format(obj))
+        sha, size = fields[0], int(fields[2])
+        contents = data[end + 1:end + 1 + size]
+        results.append((sha, contents.decode('utf-8', 'surrogateescape')))
+        position = end + 1 + size + 1
+    return results
+
+
+# String String [Dict-of String (String, String)] String -> String
+def commit_files(cwd, parent, files, message):
+    """
+    Commit files, mapping paths to (mode, contents), on top of parent and
+    return the new commit's SHA. The tree is built in a temporary index, so
+    neither the working tree nor the repo's own index is touched, however
+    big the repo is.
+    """
+    entries = []
+    for path, (mode, contents) in sorted(files.items()):
+        sha = output(['hash-object', '-w', '--stdin'], cwd,
+                     input=contents.encode('utf-8', 'surrogateescape'))
+        entries.append('{} {}\t{}\n'.format(mode, sha.strip(), path))
+
+    with tempfile.TemporaryDirectory(prefix='git-index-') as tmp:
+        env = {'GIT_INDEX_FILE': os.path.join(tmp, 'index')}
+        run(['read-tree', parent], cwd, env=env)
+        run(['update-index', '--index-info'], cwd,
+            input=''.join(entries).encode('utf-8', 'surrogateescape'),
+            env=env)
+        tree = output(['write-tree'], cwd, env=env).strip()
+    return output(['commit-tree', tree, '-p', parent, '-m', message],
+                  cwd).strip()
+
+
+# String [List-of String] -> [Dict-of String (String, [Maybe String])]
+def show_refs(cwd, refs):
+    """
+    Maps each of the full ref names given that exists to its SHA and the
+    path of the worktree it's checked out in, if any.
+    """
+    found = {}
+    lines = output(['for-each-ref', '--format=%(objectname)%00'
+                    '%(worktreepath)%00%(refname)'] + refs, cwd).splitlines()
+    for line in lines:
+        sha, worktree, name = line.split('\0')
+        if name in refs:
+            found[name] = (sha, worktree or None)
+    return found
+
+
+# String String String String [Maybe String] -> Boolean
+def advance_branch(cwd, branch, old, new, worktree):
+    """
+    Move a local branch from old to new, to match a commit pushed without
+    checking it out. A branch checked out in a worktree is fast-forwarded
+    there, which only rewrites the files that changed. False if git refused,
+    e.g. because of local edits to those files.
+    """
+    try:
+        if worktree is not None:
+            run(['merge', '--ff-only', '-q', new], worktree)
+        else:
+            run(['update-ref', 'refs/heads/{}'.format(branch), new, old],
+                cwd)
+    except GitError:
+        return False
+    return True
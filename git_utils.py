@@ -1,235 +1,151 @@
 #!/bin/python
 
-import subprocess
-import os
-import re
+import difflib
 import sys
+from functools import partial
 import utils as util
-
-import jenkins_utils
-
+import remote_refs
+import journal
+import release_plan
+import worktrees
+import version_bumps
+from push_batch import PushBatch
+
+import git_runner
+from repo_executor import run_in_repos, repo_path
 from version import Version
 from user_interaction import prompt_until_answer
 from deploy_config import REPOS, BRANCH_BASE
 
 
-# String String -> None
-def create_branches_and_update_versions(branch_base, version):
+# Plan String String -> None
+def plan_release_branches(plan, branch_base, version):
+    """
+    Cut the release branch from master in each repo, then bump the version
+    on master.
+    """
     if util.unstaged_changes_present(REPOS):
         raise Exception("one of the branches has unstaged changes, " +
                         "please stash and try again")
-    util.pull_masters(REPOS)
 
     branch_name = "{}{}".format(branch_base, version)
-    if util.branch_exists_in_repos(branch_name, REPOS):
-        raise Exception("commcare_{} branch already exists".format(version))
-
-    create_release_branches(branch_name)
-    update_version_numbers()
-    # enable for J2ME build
-    # mark_version_as_alpha(branch_name)
 
-
-# String -> None
-def create_release_branches(branch_name):
+    def assert_branch_is_new():
+        if util.branch_exists_in_repos(branch_name, REPOS):
+            raise Exception("commcare_{} branch already exists".format(
+                version))
+
+    inputs = {'branch': branch_name}
+    journal.step('check {} is new'.format(branch_name), assert_branch_is_new,
+                 inputs)
+
+    pulls = [plan.add('pull {} master'.format(repo), util.pull_masters,
+                      args=([repo],), resources=[release_plan.repo(repo)])
+             for repo in REPOS]
+    branches = plan.add('create {} branches'.format(branch_name),
+                        create_release_branches, args=(REPOS, branch_name),
+                        after=pulls,
+                        resources=[release_plan.repo(r) for r in REPOS],
+                        inputs=inputs,
+                        verify=partial(branches_created, REPOS, branch_name))
     for repo in REPOS:
-        checkout_master(repo)
-        create_branch(repo, branch_name)
-        checkout_master(repo)
+        # shows the diff and asks before pushing
+        plan.add('bump {} master version'.format(repo), bump_versions,
+                 args=('master', repo, 'master'), after=[branches],
+                 resources=[release_plan.repo(repo), release_plan.CONSOLE],
+                 inputs=inputs)
+    # enable for J2ME build
+    # bump_versions('alpha', 'commcare-core', branch_name)
 
 
-# String -> None
-def checkout_master(repo):
-        util.chdir_repo(repo)
-        subprocess.call('git checkout master', shell=True)
-        util.chdir_base()
+# [List-of String] String -> None
+def create_release_branches(repos, branch_name):
+    """
+    Push the branch at origin's master, which was just pulled, to every repo
+    at once; either all of them get it or none do. Nothing is checked out.
+    """
+    batch = PushBatch()
+    for repo in repos:
+        master = git_runner.rev_parse(repo_path(repo),
+                                      'refs/remotes/origin/master')
+        batch.add(repo, master, 'refs/heads/' + branch_name)
+    batch.push()
 
 
-# String String -> None
-def create_branch(repo, branch_name):
-        util.chdir_repo(repo)
-        subprocess.call('git checkout -b {}'.format(branch_name), shell=True)
-        subprocess.call('git push origin {}'.format(branch_name), shell=True)
-        util.chdir_base()
+# [List-of String] String Any -> Boolean
+def branches_created(repos, branch_name, _):
+    return all(util.branch_exists(repo, branch_name) for repo in repos)
 
 
-# None -> None
-def update_version_numbers():
-    update_commcare_version_numbers()
-    update_android_version_numbers()
+# [List-of String] String Any -> Boolean
+def tags_created(repos, tag_name, _):
+    return all(remote_refs.get_remote_refs(repo).has_tag(tag_name)
+               for repo in repos)
 
 
-# None -> None
-def update_commcare_version_numbers():
+# String String String -> None
+def bump_versions(bump, repo, branch):
     """
-    Update version numbers in build.properties and CommCareConfigEngin on
-    master.
+    Apply one of version_bumps.BUMPS to the repo's branch, as one commit.
     """
-    util.chdir_repo('commcare-core')
-    subprocess.call('git checkout master', shell=True)
+    edit_files_on_branch(repo, branch, version_bumps.file_edits(bump, repo),
+                         version_bumps.BUMPS[bump].message)
 
-    replace_func(replace_config_engine_version,
-                 'src/cli/java/org/commcare/util/engine/CommCareConfigEngine.java')
 
-    review_and_commit_changes('master',
-                              'Automated version bump')
-    util.chdir_base()
-
-
-# String -> None
-def update_commcare_hotfix_version_numbers(branch):
+# String String [Dict-of String [String -> String]] String -> None
+def edit_files_on_branch(repo, branch, edits, commit_msg):
     """
-    Update hotfix version in build.properties on hotfix branch
+    Apply each function in edits to the file at its path on the tip of
+    origin's branch, show the diff, and once confirmed push the changes to
+    the branch as a single new commit. The commit is made from git objects,
+    so the branch is never checked out; the local branch is moved along
+    with it if it was up to date.
     """
-    util.chdir_repo('commcare-core')
-    subprocess.call('git checkout {}'.format(branch), shell=True)
-
-    replace_func(incr_build_prop_hotfix_version,
-                 'application/build.properties')
-
-    review_and_commit_changes(branch,
-                              'Automated hotfix version bump')
-    util.chdir_base()
-
-
-# String String -> None
-def review_and_commit_changes(branch, commit_msg):
-    diff = subprocess.check_output("git diff", shell=True)
-    util.print_with_newlines(str(diff))
+    cwd = repo_path(repo)
+    remote_refs.fetch_branch(repo, branch)
+    remote_ref = 'refs/remotes/origin/' + branch
+    local_ref = 'refs/heads/' + branch
+    refs = git_runner.show_refs(cwd, [remote_ref, local_ref])
+    parent = refs[remote_ref][0]
+
+    changed = {}
+    diff = []
+    for path, func in sorted(edits.items()):
+        mode, contents = git_runner.read_file(cwd, parent, path)
+        new_contents = func(contents)
+        if new_contents != contents:
+            changed[path] = (mode, new_contents)
+            diff.extend(difflib.unified_diff(
+                contents.splitlines(True), new_contents.splitlines(True),
+                'a/' + path, 'b/' + path))
+    if not changed:
+        print('{} on {} is already up to date'.format(
+            ', '.join(sorted(edits)), branch))
+        return
+
+    print(''.join(diff).rstrip('\n'))
 
     question = 'Proceed by pushing diff to {}?'.format(branch)
     if prompt_until_answer(question, True):
-        subprocess.call('git add -u', shell=True)
-        subprocess.call("git commit -m '{}'".format(commit_msg),
-                        shell=True)
-        subprocess.call("git push origin {}".format(branch), shell=True)
+        commit = git_runner.commit_files(cwd, parent, changed, commit_msg)
+        batch = PushBatch()
+        batch.add(repo, commit, local_ref, old=parent)
+        batch.push()
+        local_sha, worktree = refs.get(local_ref, (None, None))
+        if local_sha == parent:
+            git_runner.advance_branch(cwd, branch, parent, commit, worktree)
     else:
         print("Exiting during code level version updates due to " +
               "incorrect diff. You'll need to manually complete the deploy.")
         sys.exit(0)
 
 
-# (String -> String) String -> None
-def replace_func(func, file_name):
-    tmp_file_name = '{}.new'.format(file_name)
-    read_file = open(file_name, 'r', encoding='utf-8')
-    write_file = open(tmp_file_name, 'w', encoding='utf-8', newline='\n')
-
-    file_contents = ''
-    for line in read_file.readlines():
-        file_contents += line
-    read_file.close()
-
-    file_contents = func(file_contents)
-
-    write_file.write(file_contents)
-    write_file.close()
-
-    os.rename(tmp_file_name, file_name)
-
-
-# String -> String
-def incr_build_prop_minor_version(file_contents):
-    return replace_build_prop(file_contents,
-                              lambda v: v.get_next_minor_release())
-
-
-# String -> String
-def incr_build_prop_hotfix_version(file_contents):
-    return replace_build_prop(file_contents,
-                              lambda v: v.get_next_hotfix())
-
-
-# String [Version -> Version] -> String
-def replace_build_prop(file_contents, get_new_version):
-    versionPattern = re.compile(r'app.version=(\d+).(\d+).(\d+)')
-    result = versionPattern.search(file_contents)
-    if result is None or len(result.groups()) != 3:
-        raise Exception("Couldn't parse version in build.properties")
-
-    version_raw = list(map(int, result.groups()))
-    version = Version(*version_raw)
-
-    next_minor = get_new_version(version)
-    print('commcare build.properties: replacing {} with {}'.format(version,
-                                                                   next_minor))
-    return file_contents.replace('app.version={}'.format(version),
-                                 'app.version={}'.format(next_minor))
-
-
-# String -> String
-def replace_config_engine_version(file_contents):
-    majorVersionPattern = re.compile(r'MAJOR_VERSION = (\d+);')
-    minorVersionPattern = re.compile(r'MINOR_VERSION = (\d+);')
-    majorResult = majorVersionPattern.search(file_contents)
-    minorResult = minorVersionPattern.search(file_contents)
-    if minorResult is None or majorResult is None:
-        raise Exception("Couldn't parse version in CommCareConfigEngine")
-    major = int(majorResult.groups()[0])
-    minor = int(minorResult.groups()[0])
-
-    platform_pattern = 'CommCarePlatform({}, {})'.format(major, minor)
-    new_platform = 'CommCarePlatform({}, {})'.format(major, minor + 1)
-    print('CommCareConfigEngine: replacing {} with {}'.format(platform_pattern,
-                                                              new_platform))
-
-    return file_contents.replace(platform_pattern, new_platform)
-
-
-# None -> None
-def update_android_version_numbers():
+# Plan String Version -> (String, Dict)
+def plan_release_tags(plan, branch_base, version):
     """
-    Update version numbers in AndroidManifest and push master.
+    Tag the release branches. Returns the tag name and the tagging action
+    for each repo.
     """
-    util.chdir_repo('commcare-android')
-    subprocess.call('git checkout master', shell=True)
-
-    replace_func(update_manifest_version, 'app/AndroidManifest.xml')
-
-    review_and_commit_changes('master', 'Automated version bump')
-
-    util.chdir_base()
-
-
-# String -> String
-def update_manifest_version(file_contents):
-    versionPattern = re.compile(r'android:versionName="(\d+).(\d+)"')
-    result = versionPattern.search(file_contents)
-    if result is None or len(result.groups()) != 2:
-        raise
-    version = result.groups()
-    major = int(version[0])
-    minor = int(version[1])
-    current_version = 'android:versionName="{}.{}"'.format(major, minor)
-    next_version = 'android:versionName="{}.{}"'.format(major, minor + 1)
-    return file_contents.replace(current_version, next_version)
-
-# String -> None
-def mark_version_as_alpha(branch_name):
-    util.chdir_repo('commcare-core')
-
-    subprocess.call('git checkout {}'.format(branch_name), shell=True)
-    subprocess.call('git pull origin {}'.format(branch_name), shell=True)
-    replace_func(set_dev_tag_to_alpha, 'application/build.properties')
-    commit_message = 'Automated commit adding dev tag to commcare version'
-    review_and_commit_changes(branch_name, commit_message)
-    subprocess.call('git checkout master', shell=True)
-    util.chdir_base()
-
-
-# String -> String
-def set_dev_tag_to_alpha(file_contents):
-    existing_version_tag = 'commcare.version=v${app.version}dev'
-    new_version_tag = 'commcare.version=v${app.version}alpha'
-
-    if file_contents.find(existing_version_tag) == -1:
-        raise Exception("unable to find dev version tag in build.properties")
-
-    return file_contents.replace(existing_version_tag, new_version_tag)
-
-
-# String Version -> String
-def create_release_tags(branch_base, version):
     if util.unstaged_changes_present(REPOS):
         raise Exception("A branch has unstaged changes, stash and try again")
 
@@ -240,88 +156,48 @@ def create_release_tags(branch_base, version):
         raise Exception("{} branch doesn't exist".format(branch_name))
 
     # TODO PLM: run this on J2ME releases:
-    # mark_version_as_release(branch_name)
-    add_hotfix_version_to_android(branch_name, 0)
-    create_tags_for_repos(branch_name, tag_name)
-
-    return tag_name
-
-
-# String -> None
-def mark_version_as_release(branch_name):
-    util.chdir_repo('commcare-j2me')
-    print("marking commcare-core {} branch for release".format(branch_name))
-
-    subprocess.call('git checkout {}'.format(branch_name), shell=True)
-    subprocess.call('git pull origin {}'.format(branch_name), shell=True)
-
-    replace_func(set_dev_tag_to_release, 'application/build.properties')
-    commit_message = "Automated: removing 'alpha' from version"
-    review_and_commit_changes(branch_name, commit_message)
-
-    util.chdir_base()
-
-
-# String -> String
-def set_dev_tag_to_release(file_contents):
-    existing_version_tag = 'commcare.version=v${app.version}alpha'
-    new_version_tag = 'commcare.version=v${app.version}'
-
-    if file_contents.find(existing_version_tag) == -1:
-        raise Exception("unable to find alpha version tag in build.properties")
-
-    return file_contents.replace(existing_version_tag, new_version_tag)
-
-
-# String Integer -> None
-def add_hotfix_version_to_android(branch_name, hotfix_count):
-    util.chdir_repo('commcare-android')
-
-    print("add hotfix ver. to commcare-android branch {}".format(branch_name))
-
-    subprocess.call('git checkout {}'.format(branch_name), shell=True)
-    subprocess.call('git pull origin {}'.format(branch_name), shell=True)
-
-    replace_func(set_hotfix_version_to_zero, 'app/AndroidManifest.xml')
-    commit_message = 'Automated: adding hotfix version to AndroidManifest'
-    review_and_commit_changes(branch_name, commit_message)
-
-    util.chdir_base()
-
-
-# String -> String
-def set_hotfix_version_to_zero(file_contents):
-    versionPattern = re.compile(r'android:versionName="(\d+).(\d+)"')
-    result = versionPattern.search(file_contents)
-    if result is None or len(result.groups()) != 2:
-        raise Exception('Expected AndroidManifest version number format _.__, got {!s}'.format(result))
-    version = result.groups()
-    major = int(version[0])
-    minor = int(version[1])
-    current_version = 'android:versionName="{}.{}'.format(major, minor)
-    version_with_hotfix_entry = '{}.0'.format(current_version)
-    return file_contents.replace(current_version, version_with_hotfix_entry)
-
-
-# String String -> None
-def create_tags_for_repos(branch_name, tag_name):
+    # bump_versions('release', 'commcare-j2me', branch_name)
+    inputs = {'branch': branch_name, 'tag': tag_name}
+    android = release_plan.repo('commcare-android')
+    hotfix_version = plan.add('add hotfix version to {}'.format(branch_name),
+                              bump_versions,
+                              args=('add hotfix', 'commcare-android',
+                                    branch_name),
+                              resources=[android, release_plan.CONSOLE],
+                              inputs=inputs)
+
+    tag = plan_tags_from_branch(plan, REPOS, branch_name, tag_name,
+                                [hotfix_version])
+    return tag_name, dict((repo, tag) for repo in REPOS)
+
+
+# Plan [List-of String] String String [List-of String] -> String
+def plan_tags_from_branch(plan, repos, branch_name, tag_name, after=()):
+    return plan.add('tag {}'.format(tag_name), create_tags_from_branch,
+                    args=(repos, branch_name, tag_name), after=after,
+                    resources=[release_plan.repo(r) for r in repos],
+                    inputs={'branch': branch_name, 'tag': tag_name},
+                    verify=partial(tags_created, repos, tag_name))
+
+
+# [List-of String] String String -> None
+def create_tags_from_branch(repos, branch_name, tag_name):
     """
-    Creates the release tag from provided branch.
+    Tag the branch as it is on origin, which is what gets built, in every
+    repo at once; either all of them get the tag or none do.
     """
-    print("creating release tags '{}' from '{}' branches".format(tag_name,
-                                                                 branch_name))
-    for repo in REPOS:
-        util.chdir_repo(repo)
-        create_tag_from_branch(branch_name, tag_name)
-        util.chdir_base()
+    print("creating release tag '{}' from '{}' branch".format(tag_name,
+                                                              branch_name))
 
+    def tip_of(task):
+        remote_refs.fetch_branch(task.repo, branch_name)
+        return git_runner.rev_parse(
+            task.path, 'refs/remotes/origin/{}'.format(branch_name))
 
-# String String -> None
-def create_tag_from_branch(branch_name, tag_name):
-    subprocess.call('git checkout {}'.format(branch_name), shell=True)
-    subprocess.call('git pull origin {}'.format(branch_name), shell=True)
-    subprocess.call('git tag {}'.format(tag_name), shell=True)
-    subprocess.call('git push origin {}'.format(tag_name), shell=True)
+    batch = PushBatch()
+    for repo, sha in zip(repos, run_in_repos(tip_of, repos)):
+        batch.add(repo, sha, 'refs/tags/' + tag_name)
+    batch.push()
 
 
 # String -> None
@@ -332,40 +208,56 @@ def close_branches(branch_name):
     print("You will also want to close the remote github branches")
     print("\tthis'll be automated once the script's been working for a while.")
 
-    for repo in REPOS:
-        util.chdir_repo(repo)
-        print("removing {} branch of {} repo".format(branch_name, repo))
-        subprocess.call('git checkout master', shell=True)
-        subprocess.call('git branch -d {}'.format(branch_name), shell=True)
-        util.chdir_base()
-
-
-# [List-of String] String Version -> None
-def create_hotfix_tags(hotfix_repos, version):
+    def remove_branch(task):
+        task.log("removing {} branch of {} repo".format(branch_name,
+                                                        task.repo))
+        for path, error in worktrees.remove_worktrees(task.repo,
+                                                      branch_name):
+            if error is None:
+                task.log("removed worktree {}".format(path))
+            else:
+                task.log("kept worktree {}: {}".format(path, error))
+        try:
+            # release branches only exist locally if they were checked out
+            git_runner.run(['branch', '-d', branch_name], task.path)
+            task.log("deleted local branch {}".format(branch_name))
+        except git_runner.BranchNotMergedError:
+            # hotfixes are made from the tags; keep unmerged work around
+            task.log("kept {}: it isn't merged".format(branch_name))
+        except git_runner.BranchCheckedOutError:
+            task.log("kept {}: it's checked out".format(branch_name))
+        except git_runner.UnknownRefError:
+            pass
+
+    run_in_repos(remove_branch, REPOS)
+
+
+# Plan [List-of String] Version -> Dict
+def plan_hotfix_tags(plan, hotfix_repos, version):
     """
-    Create hotfix tags from hotfix branch for given repos.
+    Create hotfix tags from hotfix branch for given repos. Returns the
+    tagging action for each repo.
     """
     branch_name = "{}{}".format(BRANCH_BASE, version.short_string())
     tag_name = "{}{}".format(BRANCH_BASE, version)
 
-    for repo in hotfix_repos:
-        util.chdir_repo(repo)
-        create_tag_from_branch(branch_name, tag_name)
-        util.chdir_base()
+    tag = plan_tags_from_branch(plan, hotfix_repos, branch_name, tag_name)
+    return dict((repo, tag) for repo in hotfix_repos)
 
 
-# Version -> None
-def checkout_latest_hotfix_tags(version):
-    for repo in REPOS:
-        checkout_latest_hotfix_tag(version, repo)
+# Version String -> None
+def checkout_latest_hotfix_tag(version, repo):
+    run_in_repos(lambda task: checkout_latest_hotfix_tag_in(task, version),
+                 [repo])
 
 
-def checkout_latest_hotfix_tag(version, repo):
+# RepoTask Version -> None
+def checkout_latest_hotfix_tag_in(task, version):
     def get_tag_name(v): return "{}{}".format(BRANCH_BASE, v)
 
-    hotfix_version = get_last_hotfix(repo, version)
+    hotfix_version = get_last_hotfix(task.repo, version)
     tag = get_tag_name(hotfix_version)
-    util.checkout_ref(repo, tag)
+    util.fetch_and_checkout(task, tag)
 
 
 # String Version -> Version
@@ -375,65 +267,71 @@ def get_last_hotfix(repo, version):
     return Version(version.major, version.minor, hotfix_number)
 
 
-# Version [List-of String] -> None
-def create_hotfix_branches(version, repos_to_hotfix):
+# Plan Version [List-of String] -> Dict
+def plan_hotfix_branches(plan, version, repos_to_hotfix):
+    """
+    Open hotfix branches from the latest release tag for the repos being
+    hotfixed, and check out the tag for the others, all in worktrees.
+    Returns the action that opens each repo's branch.
+    """
     def get_branch_name(v): return "{}{}".format(BRANCH_BASE, v.short_string())
 
     branch = get_branch_name(version)
-    for repo in repos_to_hotfix:
-        print(("creating hotfix branch {} for " +
-               "{} repo from latest tag").format(branch, repo))
-        create_branch(repo, branch)
+    inputs = {'branch': branch, 'repos': repos_to_hotfix}
+
+    hotfixed = [repo for repo in REPOS if repo in repos_to_hotfix]
+    branched = {}
+    if hotfixed:
+        branches = plan.add(
+            'create {} hotfix branches'.format(branch),
+            create_hotfix_branches, args=(version, hotfixed, branch),
+            resources=[release_plan.repo(r) for r in hotfixed],
+            inputs=inputs, verify=partial(branches_created, hotfixed, branch))
+        branched = dict((repo, branches) for repo in hotfixed)
+    for repo in REPOS:
+        if repo not in hotfixed:
+            plan.add('checkout latest {} release tag'.format(repo),
+                     checkout_latest_hotfix_tag, args=(version, repo),
+                     resources=[release_plan.repo(repo)], inputs=inputs)
 
     # NOTE: needed for J2ME builds
     # if "commcare-core" in repos_to_hotfix:
-    #   update_commcare_hotfix_version_numbers(branch)
+    #   bump_versions('hotfix', 'commcare-core', branch)
 
-    update_android_hotfix_version(branch)
+    if 'commcare-android' in branched:
+        plan.add('bump {} hotfix version'.format(branch),
+                 bump_versions, args=('hotfix', 'commcare-android', branch),
+                 after=[branched['commcare-android']],
+                 resources=[release_plan.repo('commcare-android'),
+                            release_plan.CONSOLE],
+                 inputs=inputs)
+    return branched
 
 
-# String -> None
-def update_android_hotfix_version(branch):
+# Version [List-of String] String -> None
+def create_hotfix_branches(version, repos, branch):
     """
-    Update hotfix version in AndroidManifest and push hotfix branch.
+    Push the branch at each repo's latest release tag, to all the repos at
+    once, then check it out in a worktree.
     """
-    util.chdir_repo('commcare-android')
-    subprocess.call('git checkout {}'.format(branch), shell=True)
-
-    replace_func(update_manifest_hotfix_version, 'app/AndroidManifest.xml')
-
-    review_and_commit_changes(branch, 'Automated hotfix version bump')
-
-    util.chdir_base()
-
-
-# String -> String
-def update_manifest_hotfix_version(file_contents):
-    versionPattern = re.compile(r'android:versionName="(\d+).(\d+).(\d+)"')
-    result = versionPattern.search(file_contents)
-    if result is None or len(result.groups()) != 3:
-        raise
-    version_raw = list(map(int, result.groups()))
-    version = Version(*version_raw)
-    current_version = 'android:versionName="{}"'.format(version)
-    next_version = 'android:versionName="{}"'.format(version.get_next_hotfix())
-    return file_contents.replace(current_version, next_version)
-
-
-# None -> Version
-def get_current_hotfix_version_from_release_tags():
-    v = jenkins_utils.get_current_release_version()
-    last_hotfix = -1
-    for repo in ["commcare-core", "commcare-android"]:
-        repo_hotfix = util.get_last_hotfix_number_in_repo(repo,
-                                                          v.short_string())
-        last_hotfix = max(last_hotfix, repo_hotfix)
-    return Version(v.major, v.minor, last_hotfix)
-
-
-# None -> Version
-def get_next_hotfix_version_from_release_tags():
-    return get_current_hotfix_version_from_release_tags().get_next_hotfix()
+    def latest_tag(task):
+        tag = "{}{}".format(BRANCH_BASE, get_last_hotfix(task.repo, version))
+        task.log(("creating hotfix branch {} for " +
+                  "{} repo from {}").format(branch, task.repo, tag))
+        remote_refs.fetch_tag(task.repo, tag)
+        return remote_refs.get_remote_refs(task.repo).tags[tag]
+
+    batch = PushBatch()
+    for repo, sha in zip(repos, run_in_repos(latest_tag, repos)):
+        batch.add(repo, sha, 'refs/heads/' + branch)
+    batch.push()
+
+    def check_out(task):
+        # the push updated origin/<branch>, which the new branch tracks
+        path = worktrees.branch_worktree(task.repo, branch)
+        task.log("{} is checked out in {}".format(branch, path))
+
+    run_in_repos(check_out, repos)
 
 
 def close_hotfix_branches():
@@ -0,0 +1,165 @@
+"""
+GitHub REST client for the scripts that look things up on GitHub.
+
+Every request goes over one pooled requests.Session. GET responses are kept
+on disk under CACHE_DIR/github with their ETag and Last-Modified headers,
+and later requests for the same URL are sent as conditional requests: a 304
+reply reuses the stored body, costs almost nothing and doesn't count against
+the API rate limit. Only the fields the scripts use are stored.
+
+Repository URLs follow a fixed pattern on github.com, so they're built
+rather than looked up.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from deploy_config import CACHE_DIR
+
+API_URL = 'https://api.github.com'
+WEB_URL = 'https://github.com'
+GITHUB_CACHE_DIR = os.path.join(CACHE_DIR, 'github')
+POOL_SIZE = 4
+TIMEOUT = 30
+
+PullRequest = namedtuple('PullRequest', ['number', 'body', 'head_ref',
+                                         'base_ref'])
+Release = namedtuple('Release', ['tag_name', 'assets'])
+Asset = namedtuple('Asset', ['name', 'browser_download_url'])
+
+
+class GitHubError(Exception):
+    def __init__(self, url, status, message):
+        self.url = url
+        self.status = status
+        super().__init__('GitHub request for {} failed ({}): {}'.format(
+            url, status, message))
+
+
+# String String -> String
+def html_url(owner, repo):
+    return '{}/{}/{}'.format(WEB_URL, owner, repo)
+
+
+# String String -> String
+def clone_url(owner, repo):
+    return html_url(owner, repo) + '.git'
+
+
+class GitHubClient:
+    """
+    token, if given, authenticates every request. Responses are cached per
+    token, since what GitHub returns can depend on who's asking.
+    """
+
+    def __init__(self, token=None, cache_dir=GITHUB_CACHE_DIR):
+        self.token = token or None
+        self.cache_dir = cache_dir
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'User-Agent': 'commcare-mobile-deploy',
+        })
+        if self.token:
+            self.session.headers['Authorization'] = 'token ' + self.token
+
+    # String [Any -> Any] -> Any
+    def get(self, path, select):
+        """
+        select(parsed JSON) of a GET for the API path, from the cache if
+        GitHub says it hasn't changed. select keeps the fields worth caching
+        and must return something JSON can store.
+        """
+        url = API_URL + path
+        cache_path = self.cache_path(url)
+        cached = read_cache_entry(cache_path)
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304 and cached is not None:
+            return cached['data']
+        if response.status_code != 200:
+            raise GitHubError(url, response.status_code,
+                              error_message(response))
+
+        data = select(response.json())
+        write_cache_entry(cache_path, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'data': data,
+        })
+        return data
+
+    # String -> String
+    def cache_path(self, url):
+        key = hashlib.sha256('{}\0{}'.format(self.token or '',
+                                              url).encode('utf-8'))
+        return os.path.join(self.cache_dir, key.hexdigest() + '.json')
+
+    # String String Integer -> PullRequest
+    def pull_request(self, owner, repo, number):
+        data = self.get('/repos/{}/{}/pulls/{}'.format(owner, repo, number),
+                        lambda pr: [pr['number'], pr['body'] or '',
+                                    pr['head']['ref'], pr['base']['ref']])
+        return PullRequest(*data)
+
+    # String String -> Release
+    def latest_release(self, owner, repo):
+        """
+        The repo's latest release, with its assets; the release itself lists
+        them, so they aren't paged through separately.
+        """
+        data = self.get('/repos/{}/{}/releases/latest'.format(owner, repo),
+                        lambda release: [
+                            release['tag_name'],
+                            [[asset['name'], asset['browser_download_url']]
+                             for asset in release['assets']]])
+        return Release(data[0], [Asset(*asset) for asset in data[1]])
+
+
+# requests.Response -> String
+def error_message(response):
+    try:
+        return response.json().get('message', response.reason)
+    except ValueError:
+        return response.reason
+
+
+# String -> [Maybe Dict]
+def read_cache_entry(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# String Dict -> None
+def write_cache_entry(path, entry):
+    """
+    Replace the entry in one step, so runs and threads sharing the cache
+    never read a half-written file.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(),
+                                         threading.get_ident())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
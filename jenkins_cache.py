@@ -0,0 +1,46 @@
+"""
+Per-run cache of Jenkins job config XML in front of a jenkins.Jenkins client.
+
+Reads are served from the cache once a job's config has been fetched; writes
+made through the cache (reconfig_job, create_job) go to Jenkins and then
+replace the cached copy, so later reads see exactly what was pushed. The
+client is looked up through a function on first use, so creating the cache
+doesn't connect to Jenkins. A run doesn't expect anyone else to change the
+jobs it works on, so cached configs are never refetched.
+"""
+
+import threading
+
+
+class JobConfigCache:
+
+    def __init__(self, get_client):
+        self.get_client = get_client
+        self.configs = {}
+        self.lock = threading.Lock()
+
+    # String -> String
+    def get_job_config(self, job_name):
+        with self.lock:
+            cached = self.configs.get(job_name)
+        if cached is not None:
+            return cached
+
+        xml = self.get_client().get_job_config(job_name)
+        self.store(job_name, xml)
+        return xml
+
+    # String String -> None
+    def reconfig_job(self, job_name, xml):
+        self.get_client().reconfig_job(job_name, xml)
+        self.store(job_name, xml)
+
+    # String String -> None
+    def create_job(self, job_name, xml):
+        self.get_client().create_job(job_name, xml)
+        self.store(job_name, xml)
+
+    # String String -> None
+    def store(self, job_name, xml):
+        with self.lock:
+            self.configs[job_name] = xml
@@ -0,0 +1,206 @@
+"""
+Jenkins client that sends every request over a small pool of keep-alive HTTP
+connections and fetches the CSRF crumb once per session.
+
+PooledJenkins is a drop-in jenkins.Jenkins: the python-jenkins API methods
+build their urllib Requests as usual and jenkins_open sends them over a
+pooled http.client connection instead of opening a new one per call.
+"""
+
+import base64
+import http.client
+import json
+import queue
+import socket
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import jenkins
+
+import tracing
+
+CRUMB_PATH = 'crumbIssuer/api/json'
+POOL_SIZE = 4
+TIMEOUT = 60
+
+Response = namedtuple('Response', ['status', 'headers', 'body'])
+
+
+class PooledJenkins(jenkins.Jenkins):
+    def __init__(self, url, username=None, password=None,
+                 pool_size=POOL_SIZE, timeout=TIMEOUT):
+        super().__init__(url, username, password, timeout)
+        parts = urlsplit(self.server)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.base_path = parts.path
+        if username is not None and password is not None:
+            credentials = '{}:{}'.format(username, password).encode('utf-8')
+            token = base64.b64encode(credentials).decode('ascii')
+            self.auth_header = 'Basic ' + token
+        else:
+            self.auth_header = None
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.crumb_lock = threading.Lock()
+
+    # None -> HTTPConnection
+    def new_connection(self):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.netloc,
+                                               timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    # String String [Maybe Bytes] [Dict-of String String] -> Response
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request over a pooled connection. url may be absolute (on this
+        server) or relative to the server's base URL. Connections the server
+        closed while idle are replaced and the request retried once.
+        """
+        path = self.request_path(url)
+        all_headers = {'Connection': 'keep-alive'}
+        if self.auth_header:
+            all_headers['Authorization'] = self.auth_header
+        all_headers.update(headers or {})
+
+        with tracing.span('jenkins', '{} {}'.format(method, path),
+                          bytes_out=len(body or b'')) as span:
+            response = self.send(method, path, body, all_headers)
+            span.set(status=response.status, bytes_in=len(response.body))
+            return response
+
+    # String String [Maybe Bytes] [Dict-of String String] -> Response
+    def send(self, method, path, body, all_headers):
+        with self.slots:
+            for attempt in range(2):
+                try:
+                    conn = self.idle.get_nowait()
+                    reused = True
+                except queue.Empty:
+                    conn = self.new_connection()
+                    reused = False
+                try:
+                    conn.request(method, path, body=body, headers=all_headers)
+                    response = conn.getresponse()
+                    data = response.read()
+                except (http.client.RemoteDisconnected, ConnectionResetError,
+                        BrokenPipeError):
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                if response.will_close:
+                    conn.close()
+                else:
+                    self.idle.put(conn)
+                return Response(response.status,
+                                dict((k.lower(), v)
+                                     for k, v in response.getheaders()),
+                                data)
+
+    # String -> String
+    def request_path(self, url):
+        parts = urlsplit(url)
+        if parts.netloc and parts.netloc != self.netloc:
+            raise jenkins.JenkinsException(
+                'Request for {} is not on {}'.format(url, self.server))
+        if not parts.netloc:
+            path = self.base_path + url.lstrip('/')
+            parts = urlsplit(path)
+        return parts.path + ('?' + parts.query if parts.query else '')
+
+    # None -> [Maybe Dict]
+    def get_crumb(self):
+        """
+        CSRF crumb for this session, fetched on first use. False if the
+        server doesn't issue crumbs.
+        """
+        with self.crumb_lock:
+            if self.crumb is None:
+                response = self.request('GET', CRUMB_PATH)
+                if response.status == 404 or not response.body:
+                    self.crumb = False
+                elif response.status >= 400:
+                    raise_for_status(response, self.server)
+                else:
+                    self.crumb = json.loads(response.body.decode('utf-8'))
+            return self.crumb
+
+    # Request -> None
+    def maybe_add_crumb(self, req):
+        crumb = self.get_crumb()
+        if crumb:
+            req.add_header(crumb['crumbRequestField'], crumb['crumb'])
+
+    # Request Boolean -> String
+    def jenkins_open(self, req, add_crumb=True):
+        return self.open_request(req, add_crumb).body.decode('utf-8')
+
+    # Request Boolean -> Response
+    def open_request(self, req, add_crumb=True):
+        """
+        Send a urllib Request built by python-jenkins, raising the same
+        exceptions jenkins.Jenkins.jenkins_open would.
+        """
+        method = req.get_method()
+        if add_crumb and method != 'GET':
+            self.maybe_add_crumb(req)
+        try:
+            response = self.request(method, req.full_url, req.data,
+                                    request_headers(req))
+            if response.status == 403 and add_crumb and self.crumb:
+                # the crumb expired with the server-side session; get a new
+                # one and try again
+                with self.crumb_lock:
+                    self.crumb = None
+                self.maybe_add_crumb(req)
+                response = self.request(method, req.full_url, req.data,
+                                        request_headers(req))
+        except socket.timeout as e:
+            raise jenkins.TimeoutException('Error in request: {}'.format(e))
+        except OSError as e:
+            raise jenkins.JenkinsException('Error in request: {}'.format(e))
+        raise_for_status(response, self.server)
+        return response
+
+    # None -> None
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# Request -> [Dict-of String String]
+def request_headers(req):
+    """
+    The Request's headers, with the form Content-Type urllib would add to a
+    request with a body and none of its own: python-jenkins' form POSTs
+    (e.g. set_next_build_number) rely on it, and Jenkins ignores the
+    parameters of a body that isn't declared a form.
+    """
+    headers = dict(req.header_items())
+    if req.data is not None and not any(name.lower() == 'content-type'
+                                        for name in headers):
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    return headers
+
+
+# Response String -> None
+def raise_for_status(response, server):
+    if response.status in (401, 403, 500):
+        raise jenkins.JenkinsException(
+            'Error in request. Possibly authentication failed [{}]'.format(
+                response.status))
+    if response.status == 404:
+        raise jenkins.NotFoundException('Requested item could not be found')
+    if response.status >= 400:
+        raise jenkins.BadHTTPException(
+            'Error communicating with server[{}]: HTTP {}'.format(
+                server, response.status))
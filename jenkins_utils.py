@@ -1,36 +1,76 @@
 #!/bin/python
-import jenkins
-import re
 import subprocess
-import os
-import xml.etree.ElementTree as ET
+import threading
+from functools import partial
 
+import journal
+import release_plan
+import remote_refs
 import utils as util
 
+from build_watcher import BuildWatcher, BuildWatchError
+from jenkins_cache import JobConfigCache
+from jenkins_views import ViewMembershipUpdates
+from job_config import JobConfig
 from version import Version
 from user_interaction import verify_value_with_user
-from deploy_config import JENKINS_USER, JENKINS_PASSWORD, BRANCH_BASE
+import deploy_config
+from deploy_config import BRANCH_BASE
 
 MOBILE_VIEW_NAME = "CommCare Mobile"
 ARCHIVED_MOBILE_VIEW_NAME = "CommCare Mobile Archive"
 
-j = jenkins.Jenkins('https://jenkins.dimagi.com',
-                    JENKINS_USER,
-                    JENKINS_PASSWORD)
+client = None
+client_lock = threading.Lock()
+
+
+# None -> PooledJenkins
+def get_jenkins():
+    """
+    Jenkins client shared by the whole run, created on first use.
+    """
+    global client
+    with client_lock:
+        if client is None:
+            # python-jenkins is slow to import; only pay for it when a
+            # command actually talks to Jenkins
+            from jenkins_client import PooledJenkins
+            client = PooledJenkins(deploy_config.JENKINS_URL,
+                                   deploy_config.JENKINS_USER,
+                                   deploy_config.JENKINS_PASSWORD)
+        return client
+
+
+configs = JobConfigCache(get_jenkins)
 
 job_roots = ['commcare-core', 'commcare-android']
 repo_to_jobs = {'commcare-core': 'commcare-core',
                 'commcare-android': 'commcare-android'}
 
 
-# None -> String
-def create_new_release_jobs():
+# None -> Version
+def confirm_next_release_version():
     """
-    Copy last releases jenkins jobs and update values to mirror the release
-    being staged.
+    Read the version being released off of Jenkins, have the user confirm
+    it and make sure its release jobs don't exist yet.
     """
-    version = get_next_release_version()
+    # recorded once confirmed, so a resumed run doesn't pick up the VERSION
+    # bumped later; keyed on the latest releases so the next cycle doesn't
+    version = journal.step('next release version',
+                           confirmed_next_release_version,
+                           {'latest releases':
+                            remote_refs.latest_releases(job_roots)},
+                           encode=str, decode=Version.parse)
+
+    journal.step('check release jobs are new',
+                 lambda: assert_jobs_dont_exist(version),
+                 {'version': str(version)})
+    return version
 
+
+# None -> Version
+def confirmed_next_release_version():
+    version = get_next_release_version()
     last_release = version.get_last_version_short()
 
     verify_message = ("Are these values correct?: " +
@@ -38,18 +78,84 @@ def create_new_release_jobs():
                                                                   version)
     exit_message = "Release versions from jenkins are incorrect, exiting."
     verify_value_with_user(verify_message, exit_message)
+    return version
 
-    assert_jobs_dont_exist(version)
+
+# Plan Version -> None
+def plan_new_release_jobs(plan, version):
+    """
+    Copy last releases jenkins jobs and update values to mirror the release
+    being staged.
+    """
+    inputs = {'version': str(version)}
+    created = [plan_new_release_job(plan, job_root, version, inputs)
+               for job_root in job_roots]
+    plan.add('update views', lambda: update_release_views(version),
+             after=created, resources=[release_plan.JENKINS], inputs=inputs)
 
     for job_root in job_roots:
-        create_new_release_job(job_root, last_release, version)
-        archive_old_release_job(job_root, version)
+        release_job = release_job_name(job_root, version)
+        release_number = plan.add('set {} build number'.format(release_job),
+                                  update_release_build_number,
+                                  args=(job_root, version, 1),
+                                  after=['create {} job'.format(release_job)],
+                                  resources=job_resources(release_job),
+                                  inputs=inputs)
+        # the release job's number is read off of the master job, so it has
+        # to be set first
+        plan.add('set {} build number'.format(job_root),
+                 update_master_build_number, args=(job_root, 2000),
+                 after=[release_number], resources=job_resources(job_root),
+                 inputs=inputs)
+
+    android_release_job = release_job_name('commcare-android', version)
+    for job_name, after in [
+            ('commcare-android', []),
+            (android_release_job,
+             ['create {} job'.format(android_release_job)])]:
+        plan.add('bump {} minor version'.format(job_name),
+                 inc_minor_version, args=(job_name,), after=after,
+                 resources=job_resources(job_name), inputs=inputs,
+                 verify=partial(job_has_version, job_name),
+                 encode=str, decode=Version.parse)
+
+
+# Plan String Version Dict -> String
+def plan_new_release_job(plan, job_root, version, inputs):
+    new_job = release_job_name(job_root, version)
+    return plan.add('create {} job'.format(new_job), create_new_release_job,
+                    args=(job_root, version.get_last_version_short(),
+                          version),
+                    resources=job_resources(new_job), inputs=inputs,
+                    verify=lambda _: get_jenkins().job_exists(new_job))
 
-    set_build_numbers(version)
-    inc_minor_version('commcare-android')
-    inc_minor_version('commcare-android-{}'.format(version.short_string()))
 
-    return version.short_string()
+# Version -> None
+def update_release_views(version):
+    """
+    Add the new release jobs to the mobile view and move the ones from two
+    releases ago to the archive.
+    """
+    with ViewMembershipUpdates(get_jenkins()) as views:
+        for job_root in job_roots:
+            new_job = release_job_name(job_root, version)
+            print("Adding {} job to {} view".format(new_job,
+                                                    MOBILE_VIEW_NAME))
+            views.add(new_job, MOBILE_VIEW_NAME)
+            archive_old_release_job(job_root, version, views)
+
+
+# String Version -> String
+def release_job_name(job_root, version):
+    return '{}-{}'.format(job_root, version.short_string())
+
+
+# String -> [List-of String]
+def job_resources(job_name):
+    """
+    Plan resources for an action that edits job_name.
+    """
+    return [release_plan.JENKINS, release_plan.job(job_name)]
 
 
 # None -> Version
@@ -58,27 +164,38 @@ def get_next_release_version():
     Reads the version number off of the 'commcare-core' job, which should be
     set to the next release.
     """
-    xml = j.get_job_config('commcare-android')
+    return load_job_config('commcare-android').version()
 
-    versionPattern = re.compile(r'VERSION=(\d+).(\d+).(\d+)')
-    current_version_raw = versionPattern.search(xml).groups()
-    if len(current_version_raw) != 3:
-        raise Exception("Couldn't find next version to deploy")
-    return Version(*map(int, current_version_raw))
+
+# String -> JobConfig
+def load_job_config(job_name):
+    return JobConfig(job_name, configs.get_job_config(job_name))
+
+
+# JobConfig -> None
+def save_job_config(config):
+    """
+    Push the config's edits to Jenkins, skipping the round trip if nothing
+    changed.
+    """
+    if not config.changed():
+        print("{} already up to date".format(config.job_name))
+        return
+    print(config.change_summary())
+    configs.reconfig_job(config.job_name, config.to_xml())
 
 
 # Version -> None
 def assert_jobs_dont_exist(version):
     for job_root in job_roots:
         job = '{}-{}'.format(job_root, version.short_string())
-        if j.job_exists(job):
+        if get_jenkins().job_exists(job):
             raise Exception("'{}' jenkins job already exists".format(job))
 
 
 # String String Version -> None
 def create_new_release_job(base_job_name, last_release, new_release_version):
     last_release_job_name = '{}-{}'.format(base_job_name, last_release)
-    xml = j.get_job_config(last_release_job_name)
 
     new_version = new_release_version.short_string()
     new_release_job_name = '{}-{}'.format(base_job_name, new_version)
@@ -86,54 +203,46 @@ def create_new_release_job(base_job_name, last_release, new_release_version):
     print("Creating job '{}' from old job '{}'".format(new_release_job_name,
                                                        last_release_job_name))
 
-    xml = replace_references_to_old_jobs(xml, last_release, new_version)
+    config = JobConfig(new_release_job_name,
+                       configs.get_job_config(last_release_job_name))
+    replace_references_to_old_jobs(config, last_release, new_version)
 
-    old_version = get_old_tag_version(xml)
-    old_tag_name = 'refs/tags/commcare_{}'.format(old_version)
+    old_tag_name = 'refs/tags/commcare_{}'.format(config.release_tag_version())
     new_ref_name = 'refs/heads/commcare_{}'.format(new_version)
     print("Replacing git tag from {} to {}".format(old_tag_name, new_ref_name))
 
-    xml = xml.replace(old_tag_name, new_ref_name)
+    replace_cccore_branch(config, last_release, new_version)
+    config.substitute({old_tag_name: new_ref_name})
 
-    xml = replace_cccore_branch(xml, last_release, new_version)
+    print(config.change_summary())
+    configs.create_job(new_release_job_name, config.to_xml())
 
-    j.create_job(new_release_job_name, xml)
-    print("Adding {} job to {} view".format(new_release_job_name,
-                                            MOBILE_VIEW_NAME))
-    add_job_to_view(new_release_job_name, MOBILE_VIEW_NAME)
 
-def replace_cccore_branch(xml, last_release, new_version):
+# JobConfig String String -> None
+def replace_cccore_branch(config, last_release, new_version):
     """
     Reads the version number off of the 'commcare-core' job and then
     replace CCCORE_BRANCH property to the new version
     """
+    if config.cccore_branch() is None:
+        return
     core_last_release_job_name = '{}-{}'.format('commcare-core', last_release)
-    core_job_xml = j.get_job_config(core_last_release_job_name)
-    version = get_old_tag_version(core_job_xml)
-    xml = xml.replace("CCCORE_BRANCH=commcare_{}".format(version),
-                      "CCCORE_BRANCH=commcare_{}".format(new_version))
-    return xml
-
-def replace_references_to_old_jobs(xml, last_release, new_version):
-    for job_base in job_roots:
-        xml = xml.replace('{}-{}'.format(job_base, last_release),
-                          '{}-{}'.format(job_base, new_version))
-    return xml
-
-
-def get_old_tag_version(xml):
-    versionPattern = re.compile(r'refs/tags/commcare_(\d+).(\d+).(\d+)')
-    branch_version_numbers = versionPattern.search(xml).groups()
+    version = load_job_config(core_last_release_job_name).release_tag_version()
+    config.substitute({"CCCORE_BRANCH=commcare_{}".format(version):
+                       "CCCORE_BRANCH=commcare_{}".format(new_version)})
 
-    if len(branch_version_numbers) != 3:
-        raise Exception("couldn't find git branch reference of format " +
-                        "refs/tags/commcare_X.X.X")
 
-    return '{}.{}.{}'.format(*branch_version_numbers)
+# JobConfig String String -> None
+def replace_references_to_old_jobs(config, last_release, new_version):
+    # not every job references every other release job
+    config.substitute(dict(('{}-{}'.format(job_base, last_release),
+                            '{}-{}'.format(job_base, new_version))
+                           for job_base in job_roots),
+                      required=False)
 
 
-# String Version -> None
-def archive_old_release_job(base_job_name, version):
+# String Version ViewMembershipUpdates -> None
+def archive_old_release_job(base_job_name, version, views):
     two_release_ago = Version(version.major, version.minor - 2, 0)
     last_release_job_name = '{}-{}'.format(base_job_name,
                                            two_release_ago.short_string())
@@ -141,51 +250,14 @@ def archive_old_release_job(base_job_name, version):
     print("moving {} to {} view".format(last_release_job_name,
                                         ARCHIVED_MOBILE_VIEW_NAME))
 
-    remove_job_from_view(last_release_job_name, MOBILE_VIEW_NAME)
-    add_job_to_view(last_release_job_name, ARCHIVED_MOBILE_VIEW_NAME)
-
-
-# String -> None
-def add_job_to_view(job_name, view_name):
-    xml = j.get_view_config(view_name)
-    tree = ET.fromstring(xml)
-    jobs = tree.find('jobNames')
-    e = ET.SubElement(jobs, 'string')
-    e.text = job_name
-
-    new_xml = ET.tostring(tree).decode('utf-8')
-    j.reconfig_view(view_name, new_xml)
-
-
-# String -> None
-def remove_job_from_view(job_name, view_name):
-    xml = j.get_view_config(view_name)
-    tree = ET.fromstring(xml)
-    jobs = tree.find('jobNames')
-    for job in list(jobs):
-        if job.text == job_name:
-            jobs.remove(job)
-            break
-
-    new_xml = ET.tostring(tree).decode('utf-8')
-    j.reconfig_view(view_name, new_xml)
-
-
-# Version -> None
-def set_build_numbers(new_version):
-    """
-    Update next build number for new release jobs by 1 and master jobs by 2000.
-    """
-    print("updating build numbers on jenkins jobs")
-    update_release_build_number('commcare-core', new_version, 1)
-    update_release_build_number('commcare-android', new_version, 1)
-    update_master_build_number('commcare-core', 2000)
-    update_master_build_number('commcare-android', 2000)
+    views.remove(last_release_job_name, MOBILE_VIEW_NAME)
+    views.add(last_release_job_name, ARCHIVED_MOBILE_VIEW_NAME)
 
 
 # String Version Integer -> None
 def update_release_build_number(job_base, current_version, increment_by):
-    current_build_number = j.get_job_info(job_base)['nextBuildNumber']
+    job_info = get_jenkins().get_job_info(job_base)
+    current_build_number = job_info['nextBuildNumber']
 
     new_job = '{}-{}'.format(job_base, current_version.short_string())
 
@@ -194,15 +266,13 @@ def update_release_build_number(job_base, current_version, increment_by):
     print('INFO:\t{} build #: {}'.format(job_base, current_build_number))
     print('\t\tsetting {} build # to {}'.format(new_job, next_build_number))
 
-    create_next_build_number_file(next_build_number)
     upload_next_build_number(new_job, next_build_number)
 
-    os.remove('nextBuildNumber')
-
 
 # String Integer -> None
 def update_master_build_number(job_name, increment_by):
-    current_build_number = j.get_job_info(job_name)['nextBuildNumber']
+    job_info = get_jenkins().get_job_info(job_name)
+    current_build_number = job_info['nextBuildNumber']
 
     next_build_number = int(current_build_number) + increment_by
 
@@ -211,22 +281,13 @@ def update_master_build_number(job_name, increment_by):
                                  current_build_number,
                                  next_build_number))
 
-    create_next_build_number_file(next_build_number)
     upload_next_build_number(job_name, next_build_number)
 
-    os.remove('nextBuildNumber')
-
-
-def create_next_build_number_file(next_build_number):
-    f = open('nextBuildNumber', 'w', encoding='utf-8', newline='\n')
-    f.write('{}\n'.format(next_build_number))
-    f.close()
-
 
 # String Integer -> None
 def upload_next_build_number(job, next_build_number):
     try:
-        j.set_next_build_number(job, next_build_number)
+        get_jenkins().set_next_build_number(job, next_build_number)
     except Exception:
         show_manual_next_build_message(job, next_build_number)
         return
@@ -235,8 +296,8 @@ def upload_next_build_number(job, next_build_number):
 # String Integer -> None
 def show_manual_next_build_message(job_name, next_build_number):
     print('Failed setting nextBuildNumber for {}'.format(job_name))
-    next_build_url = ("https://jenkins.dimagi.com/" +
-                      "job/{}/nextbuildnumber/").format(job_name)
+    next_build_url = "{}/job/{}/nextbuildnumber/".format(
+        deploy_config.JENKINS_URL.rstrip('/'), job_name)
     print(("Please manually set {}'s nextBuildNumber " +
            "to {} at \n {}").format(job_name, next_build_number,
                                     next_build_url))
@@ -248,72 +309,90 @@ def reload_job_into_jenkins_memory(job_name):
     Force jenkins to reload a job config from memory. Necessary if config
     files, such as nextBuildNumber, have changed.
     """
-    xml = j.get_job_config(job_name)
-    j.reconfig_job(job_name, xml)
+    xml = configs.get_job_config(job_name)
+    configs.reconfig_job(job_name, xml)
 
 
-# String -> None
+# String Version -> Boolean
+def job_has_version(job_name, version):
+    return str(load_job_config(job_name).version()) == str(version)
+
+
+# String -> Version
 def inc_minor_version(job_name):
     """
     Bump the VERSION build parameter by a minor version.
     """
     print(("Incrementing the minor version # on " +
            "{} jenkins job").format(job_name))
-    xml = j.get_job_config(job_name)
-    versionPattern = re.compile(r'VERSION=(\d+).(\d+).(\d+)')
-    current_version_raw = versionPattern.search(xml).groups()
-
-    if len(current_version_raw) != 3:
-        raise Exception("Couldn't parse version")
-    current_version = Version(*map(int, current_version_raw))
+    config = load_job_config(job_name)
+    current_version = config.version()
     next_minor_version = current_version.get_next_minor_release()
 
     print('changing {} version reference {} to {}'.format(job_name,
                                                           current_version,
                                                           next_minor_version))
 
-    xml = xml.replace("VERSION={}".format(current_version),
-                      "VERSION={}".format(next_minor_version))
+    config.set_version(next_minor_version)
+    save_job_config(config)
+    return next_minor_version
 
-    j.reconfig_job(job_name, xml)
 
+# Plan Version [List-of String] -> String
+def plan_hotfix_version_bump(plan, version, after=()):
+    job_name = release_job_name('commcare-android', version)
+    # keyed on X.XX: re-reading the job after the bump gives the new version
+    return plan.add('bump {} hotfix version'.format(job_name),
+                    inc_hotfix_version_on_job,
+                    args=('commcare-android', version), after=after,
+                    resources=job_resources(job_name),
+                    inputs={'release': version.short_string()},
+                    verify=partial(job_has_version, job_name),
+                    encode=str, decode=Version.parse)
 
-# String -> None
-def inc_hotfix_version(version):
-    inc_hotfix_version_on_job("commcare-android", version)
 
-
-# String String -> None
+# String Version -> Version
 def inc_hotfix_version_on_job(base_job_name, version):
     """
     Bump the commcare-android VERSION build parameter of a release job by a
     hotfix version.
     """
     job_name = "{}-{}".format(base_job_name, version.short_string())
-    xml = j.get_job_config(job_name)
-    versionPattern = re.compile(r'VERSION=(\d+).(\d+).(\d+)')
-    current_version_raw = versionPattern.search(xml).groups()
-
-    if len(current_version_raw) != 3:
-        raise Exception("Couldn't parse version")
-    current_version = Version(*map(int, current_version_raw))
+    config = load_job_config(job_name)
+    current_version = config.version()
     next_hotfix_version = current_version.get_next_hotfix()
 
     print('changing {} version reference {} to {}'.format(job_name,
                                                           current_version,
                                                           next_hotfix_version))
 
-    xml = xml.replace("VERSION={}".format(current_version),
-                      "VERSION={}".format(next_hotfix_version))
-
-    j.reconfig_job(job_name, xml)
+    config.set_version(next_hotfix_version)
+    save_job_config(config)
+    return next_hotfix_version
 
 
-# String String Version -> None
-def make_release_jobs_use_tags(branch, tag, version):
+# Plan String String Version Dict -> [List-of String]
+def plan_release_jobs_use_tags(plan, branch, tag, version, tagged):
+    """
+    Point each release job at the release tag once it exists. tagged maps
+    repos to the actions that tag them.
+    """
+    inputs = {'branch': branch, 'tag': tag}
+    actions = []
     for job_root in job_roots:
-        make_release_job_use_tag(job_root, version.short_string(), branch, tag,
-                                 job_root == "commcare-android")
+        update_core_ref = job_root == "commcare-android"
+        after = [tagged[job_root]]
+        if update_core_ref:
+            after.append(tagged['commcare-core'])
+        job_name = release_job_name(job_root, version)
+        actions.append(plan.add('point {} at {}'.format(job_name, tag),
+                                make_release_job_use_tag,
+                                args=(job_root, version.short_string(),
+                                      branch, tag, update_core_ref),
+                                after=after,
+                                resources=job_resources(job_name),
+                                inputs=inputs))
+    return actions
 
 
 # String String String String Boolean -> None
@@ -374,19 +453,50 @@ def replace_references_in_job(base_job_name, version_str, replacement_map):
 
     print("updating {} to build with: {}".format(job_name, replacement_map))
 
-    xml = j.get_job_config(job_name)
-    for current_ref, new_ref in replacement_map:
-        xml = xml.replace(current_ref, new_ref)
+    config = load_job_config(job_name)
+    config.substitute(dict(replacement_map))
+    save_job_config(config)
+
 
-    j.reconfig_job(job_name, xml)
+# Plan Version [List-of String] [List-of String] -> String
+def plan_build_release(plan, version, after, repos=job_roots):
+    """
+    Build the release once the actions in after have set up its jobs.
+    """
+    # the watcher reports progress as it goes, so it keeps the console
+    return plan.add('build {}'.format(version), build_release,
+                    args=(version, repos), after=after,
+                    resources=[release_plan.JENKINS, release_plan.CONSOLE],
+                    inputs={'version': str(version), 'repos': repos})
 
 
 # Version String -> None
-def build_release(version):
-    j.build_job("commcare-core-{}".format(version.short_string()))
-    print(("Release builds have been triggered. " +
-           "When they finish (~10 minutes) name them {} " +
-           "and mark 'keep this build forever'").format(version))
+def build_release(version, repos=job_roots):
+    """
+    Trigger the release build, wait for it and the commcare-android build
+    it kicks off, then name both after the version and keep them forever.
+    Builds start from commcare-core-X.XX unless commcare-core isn't among
+    the repos being released.
+    """
+    version_short = version.short_string()
+    android_job = 'commcare-android-{}'.format(version_short)
+    if 'commcare-core' in repos:
+        trigger_job = 'commcare-core-{}'.format(version_short)
+        downstream_job = android_job
+    else:
+        trigger_job = android_job
+        downstream_job = None
+
+    print("Triggering {} and waiting for the release builds".format(
+        trigger_job))
+    try:
+        BuildWatcher(get_jenkins()).run(trigger_job, downstream_job,
+                                        str(version))
+    except BuildWatchError as e:
+        print(e)
+        print(("Couldn't lock in the release builds automatically. " +
+               "When they finish (~10 minutes) name them {} " +
+               "and mark 'keep this build forever'").format(version))
 
 
 # None -> Version
@@ -395,73 +505,81 @@ def get_latest_release_job_version():
     Reads the version number off of the commcare-android job, and use it to
     find the hotfix version in the latest commcare-android-X.XX job.
     """
-    master_xml = j.get_job_config('commcare-android')
-
-    versionPattern = re.compile(r'VERSION=(\d+).(\d+).(\d+)')
-    next_version_raw = versionPattern.search(master_xml).groups()
-    if len(next_version_raw) != 3:
-        raise Exception("Couldn't find next version to deploy")
-    next_version = Version(*map(int, next_version_raw))
+    next_version = load_job_config('commcare-android').version()
 
     last_version = next_version.get_last_version_short()
     staged_release_job = 'commcare-android-{}'.format(last_version)
-    release_xml = j.get_job_config(staged_release_job)
-    current_version_raw = versionPattern.search(release_xml).groups()
-    if len(current_version_raw) != 3:
-        raise Exception("Couldn't find next version to deploy")
-    return Version(*map(int, current_version_raw))
+    return load_job_config(staged_release_job).version()
 
 
-# [List-of String] -> None
-def build_jobs_against_hotfix_branches(hotfix_repos):
+# Plan Version [List-of String] Dict -> [List-of String]
+def plan_jobs_against_hotfix_branches(plan, version, hotfix_repos, branched):
     """
     Make release jobs for hotfix repos build off of the newly opened hotfix
-    branches.
+    branches. branched maps repos to the actions that open their branches.
     """
-    # NOTE PLM: not sure if the hotfix version is correct, but it is okay
-    # because it isn't used here
-    version = get_latest_release_job_version()
-    version_short = version.short_string()
+    return [plan_hotfix_job_update(plan, 'branch', version, repo,
+                                   hotfix_repos, [branched[repo]])
+            for repo in hotfix_repos]
 
-    for repo in hotfix_repos:
-        last_hotfix = util.get_last_hotfix_number_in_repo(repo, version_short)
-        hotfix_version = Version(version.major,
-                                 version.minor,
-                                 last_hotfix)
-        tag = get_tag_name(hotfix_version)
-        job_name = repo_to_jobs[repo]
-        branch = get_branch_name(version)
-        update_core_ref = (repo == "commcare-android" and
-                           "commcare-core" in hotfix_repos)
-        make_release_job_use_branch(job_name, version.short_string(),
-                                    tag, branch, update_core_ref)
-
-
-# [List-of String] -> None
-def build_jobs_against_hotfix_tags(hotfix_repos):
+
+# Plan Version [List-of String] Dict -> [List-of String]
+def plan_jobs_against_hotfix_tags(plan, version, hotfix_repos, tagged):
     """
     Make release jobs for hotfix repos build off of the newly created hotfix
-    tags.
+    tags. tagged maps repos to the actions that create their tags.
+    """
+    actions = []
+    for repo in hotfix_repos:
+        after = [tagged[repo]]
+        if repo_updates_core_ref(repo, hotfix_repos):
+            after.append(tagged['commcare-core'])
+        actions.append(plan_hotfix_job_update(plan, 'tag', version, repo,
+                                              hotfix_repos, after))
+    return actions
+
+
+# Plan String Version String [List-of String] [List-of String] -> String
+def plan_hotfix_job_update(plan, ref_kind, version, repo, hotfix_repos,
+                           after):
+    job_name = release_job_name(repo_to_jobs[repo], version)
+    return plan.add('point {} at hotfix {}'.format(job_name, ref_kind),
+                    build_job_against_hotfix_ref,
+                    args=(ref_kind, version, repo, hotfix_repos),
+                    after=after, resources=job_resources(job_name),
+                    inputs={'version': str(version), 'repos': hotfix_repos})
+
+
+# String Version String [List-of String] -> None
+def build_job_against_hotfix_ref(ref_kind, version, repo, hotfix_repos):
+    """
+    Switch a hotfix repo's release job between the hotfix branch and its
+    latest hotfix tag; ref_kind is the one it should build off of.
     """
     # NOTE PLM: not sure if the hotfix version is correct, but it is okay
     # because it isn't used here
-    version = get_latest_release_job_version()
     version_short = version.short_string()
-
-    for repo in hotfix_repos:
-        last_hotfix = util.get_last_hotfix_number_in_repo(repo, version_short)
-        hotfix_version = Version(version.major,
-                                 version.minor,
-                                 last_hotfix)
-        tag = get_tag_name(hotfix_version)
-        job_name = repo_to_jobs[repo]
-        branch = get_branch_name(version)
-        update_core_ref = (repo == "commcare-android" and
-                           "commcare-core" in hotfix_repos)
-        make_release_job_use_tag(job_name, version.short_string(), branch, tag,
+    last_hotfix = util.get_last_hotfix_number_in_repo(repo, version_short)
+    hotfix_version = Version(version.major,
+                             version.minor,
+                             last_hotfix)
+    tag = get_tag_name(hotfix_version)
+    job_name = repo_to_jobs[repo]
+    branch = get_branch_name(version)
+    update_core_ref = repo_updates_core_ref(repo, hotfix_repos)
+    if ref_kind == 'branch':
+        make_release_job_use_branch(job_name, version_short, tag, branch,
+                                    update_core_ref)
+    else:
+        make_release_job_use_tag(job_name, version_short, branch, tag,
                                  update_core_ref)
 
 
+# String [List-of String] -> Boolean
+def repo_updates_core_ref(repo, hotfix_repos):
+    return repo == "commcare-android" and "commcare-core" in hotfix_repos
+
+
 def get_branch_name(v):
     return "{}{}".format(BRANCH_BASE, v.short_string())
 
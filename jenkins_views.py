@@ -0,0 +1,81 @@
+"""
+Batched updates to which jobs are listed in Jenkins list views.
+
+Adds and removes are collected for the whole run and applied with one view
+config fetch and at most one reconfig per view.
+"""
+
+import xml.etree.ElementTree as ET
+
+from job_config import parse_xml
+
+
+class ViewMembershipUpdates:
+    """
+    Collects job membership changes per view. Use as a context manager to
+    apply them when the block finishes without error, or call commit.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.changes = {}
+
+    # String String -> None
+    def add(self, job_name, view_name):
+        self.changes.setdefault(view_name, {})[job_name] = True
+
+    # String String -> None
+    def remove(self, job_name, view_name):
+        self.changes.setdefault(view_name, {})[job_name] = False
+
+    # None -> None
+    def commit(self):
+        for view_name, view_changes in self.changes.items():
+            self.apply(view_name, view_changes)
+        self.changes = {}
+
+    # String [Dict-of String Boolean] -> Boolean
+    def apply(self, view_name, view_changes):
+        """
+        Apply membership changes to one view, returning whether it had to be
+        reconfigured.
+        """
+        tree = parse_xml(self.client.get_view_config(view_name))
+        jobs = tree.find('jobNames')
+        if jobs is None:
+            raise Exception("'{}' view has no job list".format(view_name))
+
+        entries = jobs.findall('string')
+        members = set(entry.text for entry in entries)
+        updated = set(members)
+        for job_name, include in view_changes.items():
+            if include:
+                updated.add(job_name)
+            else:
+                updated.discard(job_name)
+
+        if updated == members:
+            print("'{}' view already up to date".format(view_name))
+            return False
+
+        print("'{}' view: adding {}, removing {}".format(
+            view_name, sorted(updated - members), sorted(members - updated)))
+
+        # Jenkins keeps list view jobs in a case-insensitive sorted set;
+        # write them back that way, after any <comparator> element.
+        for entry in entries:
+            jobs.remove(entry)
+        for job_name in sorted(updated, key=str.lower):
+            ET.SubElement(jobs, 'string').text = job_name
+
+        self.client.reconfig_view(view_name,
+                                  ET.tostring(tree).decode('utf-8'))
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        return False
@@ -0,0 +1,156 @@
+"""
+Parsed Jenkins job config.
+
+The XML is parsed once, comments included; accessors and edits work on the
+text of its elements and to_xml serializes the tree once with every edit
+applied. Each edit is recorded so callers can show exactly what changed
+before pushing it.
+
+Only element text is read and edited. Jenkins keeps a job's settings in
+element text; its attributes name plugins and classes, and the text between
+elements (tails) is whitespace, so neither is searched or substituted.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+
+from version import Version
+
+VERSION_PATTERN = re.compile(r'(?<![\w.-])VERSION=(\d+)\.(\d+)\.(\d+)')
+CCCORE_BRANCH_PATTERN = re.compile(r'(?<![\w.-])CCCORE_BRANCH=([^\s<]+)')
+RELEASE_TAG_PATTERN = re.compile(r'refs/tags/commcare_(\d+\.\d+\.\d+)')
+XML_DECLARATION_PATTERN = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+class JobConfigError(Exception):
+    pass
+
+
+class JobConfig:
+    def __init__(self, job_name, xml):
+        self.job_name = job_name
+        self.original_xml = xml
+        declaration = XML_DECLARATION_PATTERN.match(xml)
+        self.declaration = declaration.group().strip() if declaration else None
+        self.root = parse_xml(xml)
+        self.text_nodes = list(collect_text_nodes(self.root, ''))
+        self.changes = []
+
+    # None -> Version
+    def version(self):
+        match = self.search(VERSION_PATTERN)
+        if match is None:
+            raise JobConfigError("Couldn't find VERSION=X.X.X in "
+                                 "{}".format(self.job_name))
+        return Version(*map(int, match.groups()))
+
+    # Version -> None
+    def set_version(self, version):
+        current = self.version()
+        self.substitute({'VERSION={}'.format(current):
+                         'VERSION={}'.format(version)})
+
+    # None -> [Maybe String]
+    def cccore_branch(self):
+        match = self.search(CCCORE_BRANCH_PATTERN)
+        return match.group(1) if match else None
+
+    # None -> String
+    def release_tag_version(self):
+        """
+        X.X.X of the first refs/tags/commcare_X.X.X reference.
+        """
+        match = self.search(RELEASE_TAG_PATTERN)
+        if match is None:
+            raise JobConfigError("couldn't find git branch reference of " +
+                                 "format refs/tags/commcare_X.X.X in " +
+                                 self.job_name)
+        return match.group(1)
+
+    # [Dict-of String String] Boolean -> [Dict-of String Integer]
+    def substitute(self, replacements, required=True):
+        """
+        Replace every whole-token occurrence of each key with its value, in a
+        single pass over the elements' text (not attributes or tails).
+        Returns the number of replacements made per key. When required, a
+        key that matches nothing raises, unless its replacement is already
+        present.
+        """
+        if not replacements:
+            return {}
+        pattern = re.compile(r'(?<![\w.-])(?:{})(?![\w.])'.format(
+            '|'.join(map(re.escape, sorted(replacements, key=len,
+                                           reverse=True)))))
+        counts = dict((key, 0) for key in replacements)
+
+        for path, element in self.text_nodes:
+            def replace(match):
+                old = match.group()
+                counts[old] += 1
+                if replacements[old] != old:
+                    self.changes.append((path, old, replacements[old]))
+                return replacements[old]
+
+            element.text = pattern.sub(replace, element.text)
+
+        if required:
+            missing = [key for key, count in counts.items()
+                       if count == 0 and not self.contains(replacements[key])]
+            if missing:
+                raise JobConfigError("{}: no occurrences of {}".format(
+                    self.job_name, ', '.join(missing)))
+        return counts
+
+    # None -> Boolean
+    def changed(self):
+        return len(self.changes) > 0
+
+    # None -> String
+    def change_summary(self):
+        lines = ['{} changes:'.format(self.job_name)]
+        for path, old, new in self.changes:
+            lines.append('  {}: {!r} -> {!r}'.format(path, old, new))
+        return '\n'.join(lines)
+
+    # None -> String
+    def to_xml(self):
+        if not self.changed():
+            return self.original_xml
+        body = ET.tostring(self.root, encoding='unicode')
+        if self.declaration:
+            return '{}\n{}'.format(self.declaration, body)
+        return body
+
+    # Pattern -> [Maybe Match]
+    def search(self, pattern):
+        for _, element in self.text_nodes:
+            match = pattern.search(element.text)
+            if match:
+                return match
+        return None
+
+    # String -> Boolean
+    def contains(self, text):
+        return any(text in element.text for _, element in self.text_nodes)
+
+
+# String -> Element
+def parse_xml(xml):
+    """
+    Parse XML keeping its comments, so writing the tree back out doesn't
+    silently drop them.
+    """
+    parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+    return ET.fromstring(xml, parser=parser)
+
+
+# Element String -> [Iterator-of (String, Element)]
+def collect_text_nodes(element, parent_path):
+    if element.tag is ET.Comment:
+        # commentary, not config to read or edit
+        return
+    path = '{}/{}'.format(parent_path, element.tag)
+    if element.text and element.text.strip():
+        yield path, element
+    for child in element:
+        yield from collect_text_nodes(child, path)
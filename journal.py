@@ -0,0 +1,151 @@
+"""
+On-disk journal of the steps a deploy or hotfix command has completed.
+
+Each command runs inside open_journal(name). Work wrapped in step() is
+recorded with its inputs and output as soon as it finishes. If the command
+dies partway through, re-running it replays completed steps from the journal
+(after re-checking them, where the step knows how) and carries on from the
+first step that didn't finish. The journal is deleted once the command
+completes or stops itself cleanly (sys.exit(0), e.g. when the user rejects a
+value), and open_journal(name, fresh=True) discards one left by an earlier
+run.
+
+step() outside of an open journal just runs the work, so library functions
+can be journaled without changing how they're called.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from deploy_config import CACHE_DIR
+
+JOURNAL_DIR = os.path.join(CACHE_DIR, 'journal')
+
+active = None
+
+
+class Journal:
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.lock = threading.Lock()
+        self.steps = {}
+        self.resumed = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.steps = json.load(f).get('steps', {})
+            self.resumed = any(s.get('status') == 'done'
+                               for s in self.steps.values())
+
+    # String [Maybe Dict] -> [Maybe Dict]
+    def completed(self, name, inputs):
+        with self.lock:
+            record = self.steps.get(name)
+        if (record is not None and record.get('status') == 'done' and
+                record.get('inputs') == inputs):
+            return record
+        return None
+
+    # String Dict -> None
+    def record(self, name, entry):
+        with self.lock:
+            self.steps[name] = entry
+            self.save()
+
+    # None -> None
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = '{}.new'.format(self.path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'name': self.name, 'steps': self.steps}, f, indent=2,
+                      sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    # None -> None
+    def discard(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    # String [-> X] Dict [X -> Boolean] [X -> Any] [Any -> X] -> X
+    def run(self, name, func, inputs, verify, encode, decode):
+        record = self.completed(name, inputs)
+        if record is not None:
+            output = decode(record['output'])
+            if verify is None or verify(output):
+                print("[journal] skipping '{}', already done".format(name))
+                return output
+            print("[journal] '{}' was recorded but didn't check out; "
+                  "running it again".format(name))
+
+        started = time.time()
+        self.record(name, {'status': 'running', 'inputs': inputs,
+                           'started': started})
+        output = func()
+        self.record(name, {'status': 'done', 'inputs': inputs,
+                           'output': encode(output), 'started': started,
+                           'duration': round(time.time() - started, 3)})
+        return output
+
+
+# String -> String
+def journal_path(name):
+    return os.path.join(JOURNAL_DIR, '{}.json'.format(name))
+
+
+@contextmanager
+def open_journal(name, fresh=False):
+    """
+    Journal the steps run inside the block, starting over if fresh. Kept on
+    disk if the block fails or is interrupted, removed once it completes or
+    exits with status 0.
+    """
+    global active
+    path = journal_path(name)
+    if fresh and os.path.exists(path):
+        print("[journal] discarding {}".format(path))
+        os.remove(path)
+    journal = Journal(name, path)
+    if journal.resumed:
+        print("[journal] resuming '{}' from {}; add --fresh to start over"
+              .format(name, journal.path))
+    active = journal
+    try:
+        yield journal
+    except SystemExit as e:
+        if e.code in (None, 0):
+            journal.discard()
+        else:
+            report_saved(journal)
+        raise
+    except BaseException:
+        report_saved(journal)
+        raise
+    else:
+        journal.discard()
+    finally:
+        active = None
+
+
+# Journal -> None
+def report_saved(journal):
+    if os.path.exists(journal.path):
+        print("[journal] progress saved to {}; run the same command "
+              "again to continue".format(journal.path))
+
+
+# String [-> X] Dict [X -> Boolean] [X -> Any] [Any -> X] -> X
+def step(name, func, inputs=None, verify=None, encode=None, decode=None):
+    """
+    Run func as the journaled step called name, or replay its recorded
+    output if a previous run completed it with the same inputs and verify
+    (if given) accepts that output. encode/decode convert the output to and
+    from JSON-friendly values.
+    """
+    if active is None:
+        return func()
+    return active.run(name, func, inputs, verify,
+                      encode or (lambda x: x), decode or (lambda x: x))
@@ -0,0 +1,111 @@
+"""
+Local bare mirrors of GitHub repos, for setting up PR build checkouts
+without downloading a repo's whole history each time.
+
+Each repo has a bare mirror under MIRROR_DIR/<owner>/<repo>.git that only
+ever fetches the branches a checkout asked for, so keeping it current costs
+the commits pushed since the last build. New checkouts are cloned from the
+mirror with --shared, borrowing its objects through alternates instead of
+copying them, then pointed back at GitHub. In partial mode the mirror
+(<repo>-blobless.git) and the checkout skip file contents, which git fetches
+from GitHub as the checkout needs them.
+
+A file lock next to each mirror lets builds on the same machine share it:
+one updates and clones from it while the others wait.
+"""
+
+import fcntl
+import os
+import shutil
+from contextlib import contextmanager
+
+import git_runner
+import github_client
+from deploy_config import CACHE_DIR
+
+MIRROR_DIR = os.path.join(CACHE_DIR, 'mirrors')
+PARTIAL_FILTER = 'blob:none'
+
+
+# String String Boolean -> String
+def mirror_path(owner, repo, partial=False):
+    name = '{}-blobless.git' if partial else '{}.git'
+    return os.path.join(MIRROR_DIR, owner, name.format(repo))
+
+
+# String -> String
+def branch_refspec(branch):
+    return '+refs/heads/{0}:refs/heads/{0}'.format(branch)
+
+
+@contextmanager
+def mirror_lock(path):
+    """
+    Hold path's lock file, waiting for whoever holds it first.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# String String Boolean -> None
+def create_mirror(path, url, partial):
+    """
+    An empty bare mirror of url at path. It's set up beside path and moved
+    into place when done, so an interrupted run never leaves half a mirror.
+    """
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    git_runner.run(['init', '--quiet', '--bare', tmp_path])
+    git_runner.run(['remote', 'add', 'origin', url], tmp_path)
+    # checkouts borrow the mirror's objects, so it must never drop any, even
+    # those of a force-pushed branch
+    git_runner.run(['config', 'gc.pruneExpire', 'never'], tmp_path)
+    # lets partial checkouts be cloned from it
+    git_runner.run(['config', 'uploadpack.allowFilter', 'true'], tmp_path)
+    if partial:
+        git_runner.run(['config', 'remote.origin.promisor', 'true'], tmp_path)
+        git_runner.run(['config', 'remote.origin.partialclonefilter',
+                        PARTIAL_FILTER], tmp_path)
+    os.rename(tmp_path, path)
+
+
+# String String String Boolean -> String
+def update_mirror(owner, repo, branch, partial=False):
+    """
+    Path of the repo's mirror, created if needed, with origin's branch
+    fetched into it. The caller holds the mirror's lock.
+    """
+    path = mirror_path(owner, repo, partial)
+    if not os.path.isdir(path):
+        create_mirror(path, github_client.clone_url(owner, repo), partial)
+    git_runner.run(['fetch', '--quiet', '--no-tags', 'origin',
+                    branch_refspec(branch)], path)
+    return path
+
+
+# String String String String Boolean -> None
+def clone(owner, repo, branch, directory, partial=False):
+    """
+    Clone the repo's branch into directory by way of its mirror, leaving
+    the branch to be checked out. Only the branch is fetched from GitHub,
+    and the clone's origin is GitHub.
+    """
+    path = mirror_path(owner, repo, partial)
+    with mirror_lock(path):
+        update_mirror(owner, repo, branch, partial)
+        # not --single-branch, which would narrow the clone's fetch refspec
+        # and keep 'git checkout' from finding branches fetched later
+        args = ['clone', '--quiet', '--no-checkout', '--branch', branch]
+        if partial:
+            # a partial clone only works over a transport, not a local copy
+            args += ['--filter=' + PARTIAL_FILTER, 'file://' + path]
+        else:
+            args += ['--shared', path]
+        git_runner.run(args + [directory])
+    git_runner.run(['remote', 'set-url', 'origin',
+                    github_client.clone_url(owner, repo)], directory)
@@ -0,0 +1,142 @@
+"""
+Push the ref updates for a step across several repos as one unit.
+
+Updates are collected with add() and sent by push(): one
+'git push --atomic' per repo, every repo at once, so each repo takes all of
+its updates or none. If any repo's push fails, the refs the other repos had
+already taken are put back, and nothing is left half released, e.g. a
+commcare_X.Y.Z tag on commcare-core but not on commcare-android.
+
+Every update is pushed with --force-with-lease for the value the ref is
+expected to have on origin (or for it not existing yet), so a ref someone
+else moved in the meantime fails the push instead of being overwritten.
+"""
+
+from collections import namedtuple
+
+import git_runner
+import remote_refs
+from repo_executor import run_in_repos, RepoExecutionError
+
+# old is the SHA expected on origin, None for a ref that shouldn't exist yet
+RefUpdate = namedtuple('RefUpdate', ['sha', 'ref', 'old'])
+
+
+class PushError(Exception):
+    """
+    Raised by PushBatch.push. failures is a list of (repo, exception) for
+    the pushes that failed; rolled_back the repos whose pushed refs were put
+    back, and rollback_failures any that couldn't be.
+    """
+
+    def __init__(self, failures, rolled_back, rollback_failures):
+        self.failures = failures
+        self.rolled_back = rolled_back
+        self.rollback_failures = rollback_failures
+        message = 'push failed in {}'.format(
+            '; '.join('{}: {}'.format(repo, error)
+                      for repo, error in failures))
+        if rolled_back:
+            message += '; rolled back {}'.format(', '.join(rolled_back))
+        if rollback_failures:
+            message += '; could not roll back {}'.format('; '.join(
+                '{}: {}'.format(repo, error)
+                for repo, error in rollback_failures))
+        super().__init__(message)
+
+
+class PushBatch:
+    def __init__(self):
+        # repo -> [List-of RefUpdate], in the order repos were first added
+        self.updates = {}
+
+    # String String String [Maybe String] -> None
+    def add(self, repo, sha, ref, old=None):
+        """
+        Set origin's ref (a full ref name) to sha. old is what origin's ref
+        should be now; None if it shouldn't exist.
+        """
+        self.updates.setdefault(repo, []).append(RefUpdate(sha, ref, old))
+
+    # None -> None
+    def push(self):
+        repos = list(self.updates)
+        # repo -> the updates it took, for repos whose push went through
+        changed = {}
+
+        def push_in(task):
+            changed[task.repo] = push_updates(task, self.updates[task.repo])
+
+        try:
+            run_in_repos(push_in, repos)
+        except RepoExecutionError as e:
+            pushed = [repo for repo in repos if changed.get(repo)]
+            rollback_failures = []
+            if pushed:
+                try:
+                    run_in_repos(lambda task: roll_back(
+                        task, changed[task.repo]), pushed)
+                except RepoExecutionError as rollback_error:
+                    rollback_failures = rollback_error.failures
+            not_rolled_back = [repo for repo, _ in rollback_failures]
+            raise PushError(e.failures,
+                            [r for r in pushed if r not in not_rolled_back],
+                            rollback_failures)
+
+
+# RepoTask [List-of RefUpdate] -> [List-of RefUpdate]
+def push_updates(task, updates):
+    """
+    Push the updates in one go, returning those that changed a ref; refs
+    already set to their new value are left out.
+    """
+    leases = ['--force-with-lease={}:{}'.format(u.ref, u.old or '')
+              for u in updates]
+    specs = ['{}:{}'.format(u.sha, u.ref) for u in updates]
+    results = push(task, leases, specs)
+    return [u for u in updates if results.get(u.ref) != '=']
+
+
+# RepoTask [List-of RefUpdate] -> None
+def roll_back(task, updates):
+    """
+    Return refs pushed by push_updates to what they were, as long as nobody
+    has moved them since.
+    """
+    task.log('rolling back {}'.format(', '.join(u.ref for u in updates)))
+    leases = ['--force-with-lease={}:{}'.format(u.ref, u.sha)
+              for u in updates]
+    specs = ['{}:{}'.format(u.old or '', u.ref) for u in updates]
+    push(task, leases, specs)
+
+
+# RepoTask [List-of String] [List-of String] -> [Dict-of String String]
+def push(task, leases, specs):
+    """
+    Run an atomic push, logging a line per ref, and return each ref's
+    porcelain flag ('=' for up to date, '!' for rejected, ...).
+    """
+    args = ['push', '--atomic', '--porcelain'] + leases + ['origin'] + specs
+    try:
+        output = git_runner.run(args, task.path).stdout
+    except git_runner.GitError as e:
+        log_results(task, e.output)
+        raise
+    finally:
+        remote_refs.invalidate(task.repo)
+    return log_results(task, output)
+
+
+# RepoTask String -> [Dict-of String String]
+def log_results(task, output):
+    results = {}
+    for line in output.splitlines():
+        # <flag> TAB <src>:<dst> TAB <summary>
+        fields = line.split('\t')
+        if len(fields) == 3 and ':' in fields[1]:
+            ref = fields[1].split(':', 1)[1]
+            results[ref] = fields[0]
+            task.log('{} {}'.format(ref, fields[2]))
+        elif line.startswith(('error:', 'fatal:')):
+            task.log(line)
+    return results
@@ -0,0 +1,49 @@
+"""
+The commcare_X.Y.Z release tags of a repo as a sorted list of Versions.
+
+Releases of a line X.Y sit next to each other in a sorted list, so the
+latest hotfix of a line is one bisect away however many tags a repo has.
+"""
+
+import bisect
+import re
+
+from deploy_config import BRANCH_BASE
+from version import Version
+
+RELEASE_TAG_PATTERN = re.compile(
+    r'^{}(\d+\.\d+\.\d+)$'.format(BRANCH_BASE))
+
+
+# [Iterable-of String] -> [List-of Version]
+def release_versions(tag_names):
+    """
+    Sorted versions of the release tags among tag_names.
+    """
+    versions = []
+    for tag in tag_names:
+        match = RELEASE_TAG_PATTERN.match(tag)
+        if match:
+            versions.append(Version.parse(match.group(1)))
+    versions.sort()
+    return versions
+
+
+# (U Version String) -> (Integer, Integer)
+def line_of(line):
+    """
+    (major, minor) of a Version or an 'X.Y' string.
+    """
+    if isinstance(line, Version):
+        return line.major, line.minor
+    major, minor = line.split('.')
+    return int(major), int(minor)
+
+
+# [List-of Version] (U Version String) -> [Maybe Version]
+def latest_in_line(versions, line):
+    major, minor = line_of(line)
+    i = bisect.bisect_left(versions, Version(major, minor + 1, 0))
+    if i and (versions[i - 1].major, versions[i - 1].minor) == (major, minor):
+        return versions[i - 1]
+    return None
@@ -0,0 +1,317 @@
+"""
+Plan-then-execute for the deploy and hotfix commands.
+
+A command first builds a Plan: every git and Jenkins mutation it is going to
+make, as named actions along with the actions each has to wait for and the
+resources it uses. The plan is printed before anything runs; with --dry-run
+that is all that happens.
+
+Executing a plan starts each action as soon as the actions it depends on
+have finished and its resources are free, so unrelated work (tagging
+commcare-core and commcare-android, editing different jobs) overlaps and a
+command takes about as long as its longest chain of dependent actions.
+
+Resources are plain names: a repo's working copy, a Jenkins job, the Jenkins
+server as a whole, and the console for actions that talk to the user. Each
+allows RESOURCE_LIMITS holders at once, one unless listed there.
+
+Once an action fails no new ones are started. Those already running are
+left to finish, then PlanExecutionError reports what failed and what never
+ran. Actions run as journal steps, so running the command again skips the
+ones that completed.
+"""
+
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import journal
+import tracing
+
+MAX_WORKERS = 8
+
+JENKINS = 'jenkins'
+# prompts, and output the user needs to see as it happens
+CONSOLE = 'console'
+# the process's working directory, for code that still chdirs
+WORKING_DIR = 'cwd'
+
+# same as the Jenkins client's connection pool
+RESOURCE_LIMITS = {JENKINS: 4}
+
+# set by the scripts' --dry-run flag
+dry_run = False
+
+
+class PlanError(Exception):
+    pass
+
+
+class PlanExecutionError(Exception):
+    """
+    Raised once a plan has stopped because actions failed. failures is a list
+    of (action name, exception) and not_run the names of the actions that
+    never started.
+    """
+
+    def __init__(self, failures, not_run):
+        self.failures = failures
+        self.not_run = not_run
+        message = '; '.join('{}: {}'.format(name, error)
+                            for name, error in failures)
+        if not_run:
+            message += ' ({} action(s) not run)'.format(len(not_run))
+        super().__init__('release actions failed: {}'.format(message))
+
+
+class Action:
+    def __init__(self, name, func, args, after, resources, inputs, verify,
+                 encode, decode):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.after = after
+        self.resources = resources
+        self.inputs = inputs
+        self.verify = verify
+        self.encode = encode
+        self.decode = decode
+        self.output = ''
+
+    # None -> Any
+    def run(self):
+        with tracing.span('action', self.name):
+            return journal.step(self.name, lambda: self.func(*self.args),
+                                self.inputs, self.verify, self.encode,
+                                self.decode)
+
+
+class Plan:
+    def __init__(self, title):
+        self.title = title
+        self.actions = []
+        self.by_name = {}
+
+    # String [-> X] ... -> String
+    def add(self, name, func, args=(), after=(), resources=(), inputs=None,
+            verify=None, encode=None, decode=None):
+        """
+        Add an action that calls func(*args) once every action named in after
+        is done, holding resources while it runs. inputs, verify, encode and
+        decode are passed on to journal.step. Returns the action's name, for
+        use in later actions' after.
+
+        Dependencies have to be added first, which keeps plans acyclic.
+        """
+        if name in self.by_name:
+            raise PlanError("'{}' is already in the plan".format(name))
+        missing = [dep for dep in after if dep not in self.by_name]
+        if missing:
+            raise PlanError("'{}' depends on {}, which aren't in the "
+                            "plan".format(name, ', '.join(missing)))
+        action = Action(name, func, tuple(args), list(after),
+                        list(resources), inputs, verify, encode, decode)
+        self.actions.append(action)
+        self.by_name[name] = action
+        return name
+
+    # None -> [List-of [List-of Action]]
+    def stages(self):
+        """
+        Group actions by the length of the dependency chain leading up to
+        them: the order they'd run in given unlimited resources.
+        """
+        depth = {}
+        stages = []
+        for action in self.actions:
+            depth[action.name] = 1 + max([depth[dep] for dep in action.after],
+                                         default=-1)
+            if depth[action.name] == len(stages):
+                stages.append([])
+            stages[depth[action.name]].append(action)
+        return stages
+
+    # None -> String
+    def describe(self):
+        stages = self.stages()
+        lines = ['{}: {} actions, {} stage(s)'.format(self.title,
+                                                      len(self.actions),
+                                                      len(stages))]
+        for number, stage in enumerate(stages, 1):
+            lines.append('  stage {}'.format(number))
+            for action in stage:
+                details = []
+                if action.after:
+                    details.append('after ' + ', '.join(action.after))
+                if action.resources:
+                    details.append('uses ' + ', '.join(action.resources))
+                lines.append('    - {}{}'.format(
+                    action.name,
+                    ' ({})'.format('; '.join(details)) if details else ''))
+        return '\n'.join(lines)
+
+    # [Maybe Dict] Integer -> Dict
+    def execute(self, limits=None, max_workers=MAX_WORKERS):
+        """
+        Run the plan, returning each action's result by name.
+        """
+        return PlanExecutor(self, limits, max_workers).run()
+
+
+class PlanExecutor:
+    def __init__(self, plan, limits, max_workers):
+        self.plan = plan
+        self.limits = dict(RESOURCE_LIMITS, **(limits or {}))
+        self.max_workers = max_workers
+        self.in_use = {}
+
+    # Action -> Boolean
+    def available(self, action):
+        return all(self.in_use.get(r, 0) < self.limits.get(r, 1)
+                   for r in action.resources)
+
+    # Action Integer -> None
+    def hold(self, action, count):
+        for resource in action.resources:
+            self.in_use[resource] = self.in_use.get(resource, 0) + count
+
+    # None -> Dict
+    def run(self):
+        waiting_on = dict((a.name, set(a.after)) for a in self.plan.actions)
+        pending = list(self.plan.actions)
+        running = {}
+        results = {}
+        failures = []
+        output = ActionOutput(sys.stdout)
+
+        sys.stdout = output
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while True:
+                    if not failures:
+                        for action in list(pending):
+                            if len(running) >= self.max_workers:
+                                break
+                            if (waiting_on[action.name] or
+                                    not self.available(action)):
+                                continue
+                            pending.remove(action)
+                            self.hold(action, 1)
+                            output.started(action)
+                            running[pool.submit(output.run, action)] = action
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        action = running.pop(future)
+                        self.hold(action, -1)
+                        output.finished(action)
+                        error = future.exception()
+                        if error is not None:
+                            failures.append((action.name, error))
+                            continue
+                        results[action.name] = future.result()
+                        for waiting in waiting_on.values():
+                            waiting.discard(action.name)
+        finally:
+            sys.stdout = output.stream
+
+        for _, error in failures:
+            # the user chose to stop; leave quietly as the commands always
+            # have
+            if isinstance(error, (SystemExit, KeyboardInterrupt)):
+                raise error
+        if failures:
+            raise PlanExecutionError(failures, [a.name for a in pending])
+        return results
+
+
+class ActionOutput:
+    """
+    Stands in for sys.stdout while a plan runs. What an action prints is
+    buffered and shown in one piece when it finishes, except for console
+    actions, which write straight through. Output finishing while a console
+    action is running is held back until it's done.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+        self.held = []
+        self.console_actions = 0
+
+    # String -> Integer
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    # None -> None
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    # Action -> Any
+    def run(self, action):
+        if CONSOLE in action.resources:
+            return action.run()
+        ident = threading.get_ident()
+        buffer = io.StringIO()
+        self.buffers[ident] = buffer
+        try:
+            return action.run()
+        finally:
+            del self.buffers[ident]
+            action.output = buffer.getvalue()
+
+    # Action -> None
+    def started(self, action):
+        if CONSOLE in action.resources:
+            self.show_held()
+            self.console_actions += 1
+            self.stream.write('[{}]\n'.format(action.name))
+
+    # Action -> None
+    def finished(self, action):
+        if CONSOLE in action.resources:
+            self.console_actions -= 1
+        elif action.output:
+            self.held.append(action)
+        if not self.console_actions:
+            self.show_held()
+
+    # None -> None
+    def show_held(self):
+        for action in self.held:
+            self.stream.write('[{}]\n{}'.format(action.name, action.output))
+            if not action.output.endswith('\n'):
+                self.stream.write('\n')
+        self.held = []
+        self.stream.flush()
+
+
+# Plan -> Dict
+def run(plan):
+    """
+    Print the plan, then execute it unless this is a dry run.
+    """
+    print(plan.describe())
+    if dry_run:
+        print('Dry run: nothing was changed')
+        return {}
+    return plan.execute()
+
+
+# String -> String
+def repo(name):
+    return 'repo:{}'.format(name)
+
+
+# String -> String
+def job(name):
+    return 'job:{}'.format(name)
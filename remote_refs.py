@@ -0,0 +1,183 @@
+"""
+Index of the branches and tags on each repo's origin remote.
+
+The first query for a repo runs a single `git ls-remote --heads --tags
+origin` and every later branch or hotfix tag lookup for that repo is answered
+from memory. Anything that pushes a branch or tag to origin should call
+invalidate so the next query sees the new ref.
+
+Fetches go through here too. fetch_branch and fetch_tag ask origin for just
+that ref, and each ref is fetched at most once per process; fetch_all is the
+full 'git fetch --tags -f' for when everything is wanted.
+"""
+
+import threading
+
+import git_runner
+from release_catalog import release_versions, latest_in_line
+from repo_executor import repo_path, run_in_repos
+
+# marks a repo whose branches and tags have all been fetched
+ALL_REFS = '*'
+
+snapshots = {}
+snapshots_lock = threading.Lock()
+repo_locks = {}
+# repo -> refspecs fetched by this process
+fetched = {}
+
+
+class RemoteRefs:
+    """
+    Snapshot of a remote's refs. heads and tags map short ref names to SHAs;
+    releases is the sorted versions of its release tags.
+    """
+
+    def __init__(self, heads, tags):
+        self.heads = heads
+        self.tags = tags
+        self.releases = release_versions(tags)
+
+    # String -> Boolean
+    def has_branch(self, branch_name):
+        return branch_name in self.heads
+
+    # String -> Boolean
+    def has_tag(self, tag_name):
+        return tag_name in self.tags
+
+    # String -> [Maybe Integer]
+    def last_hotfix(self, version_short_str):
+        latest = latest_in_line(self.releases, version_short_str)
+        return None if latest is None else latest.hotfix
+
+
+# [List-of (String, String)] -> RemoteRefs
+def index_refs(refs):
+    heads = {}
+    tags = {}
+    for sha, ref in refs:
+        if ref.startswith('refs/heads/'):
+            heads[ref[len('refs/heads/'):]] = sha
+        elif ref.startswith('refs/tags/'):
+            name = ref[len('refs/tags/'):]
+            if name.endswith('^{}'):
+                # peeled entry of an annotated tag; point at the commit
+                tags[name[:-3]] = sha
+            else:
+                tags.setdefault(name, sha)
+    return RemoteRefs(heads, tags)
+
+
+# String -> Lock
+def get_repo_lock(repo):
+    with snapshots_lock:
+        return repo_locks.setdefault(repo, threading.Lock())
+
+
+# String -> RemoteRefs
+def get_remote_refs(repo):
+    """
+    Snapshot of the repo's origin refs, fetched once per process unless
+    invalidated.
+    """
+    with get_repo_lock(repo):
+        refs = snapshots.get(repo)
+        if refs is None:
+            refs = index_refs(git_runner.ls_remote(repo_path(repo)))
+            snapshots[repo] = refs
+        return refs
+
+
+# [List-of String] -> [Dict-of String [Maybe String]]
+def latest_releases(repos):
+    """
+    Maps each repo to its latest release version on origin, if it has one.
+    These change from one release or hotfix to the next, so steps keyed on
+    them aren't replayed from a journal left by an earlier cycle.
+    """
+    repo_refs = run_in_repos(lambda task: get_remote_refs(task.repo), repos)
+    latest = {}
+    for repo, refs in zip(repos, repo_refs):
+        latest[repo] = str(refs.releases[-1]) if refs.releases else None
+    return latest
+
+
+# String -> None
+def invalidate(repo):
+    with get_repo_lock(repo):
+        snapshots.pop(repo, None)
+
+
+# String [List-of String] -> None
+def fetch(repo, refspecs):
+    """
+    Fetch the refspecs from origin, skipping any this process already has.
+    Other tags aren't followed, so only what's asked for is transferred.
+    """
+    with get_repo_lock(repo):
+        done = fetched.setdefault(repo, set())
+        if ALL_REFS in done:
+            return
+        wanted = [spec for spec in refspecs if spec not in done]
+        if wanted:
+            git_runner.run(['fetch', '--no-tags', 'origin'] + wanted,
+                           repo_path(repo))
+            done.update(wanted)
+
+
+# String -> String
+def branch_refspec(branch):
+    return '+refs/heads/{0}:refs/remotes/origin/{0}'.format(branch)
+
+
+# String String -> None
+def fetch_branch(repo, branch):
+    fetch(repo, [branch_refspec(branch)])
+
+
+# String String [[List-of String] -> Any] -> None
+def pull(repo, branch, git):
+    """
+    Merge origin's branch into the checked out one by running git (e.g. a
+    RepoTask's) in the repo: a 'git pull' of just that branch, or only the
+    merge if this process has already fetched it.
+    """
+    spec = branch_refspec(branch)
+    with get_repo_lock(repo):
+        done = fetched.setdefault(repo, set())
+        if ALL_REFS in done or spec in done:
+            git(['merge', 'refs/remotes/origin/{}'.format(branch)])
+        else:
+            git(['pull', '--no-tags', 'origin', spec])
+            done.add(spec)
+
+
+# String String -> None
+def fetch_tag(repo, tag):
+    fetch(repo, ['+refs/tags/{0}:refs/tags/{0}'.format(tag)])
+
+
+# String String -> None
+def fetch_ref(repo, ref):
+    """
+    Fetch a branch or tag given by its short name. Anything origin doesn't
+    have under that name (e.g. a SHA) gets a full fetch.
+    """
+    refs = get_remote_refs(repo)
+    if refs.has_tag(ref):
+        fetch_tag(repo, ref)
+    elif refs.has_branch(ref):
+        fetch_branch(repo, ref)
+    else:
+        fetch_all(repo)
+
+
+# String -> None
+def fetch_all(repo):
+    with get_repo_lock(repo):
+        done = fetched.setdefault(repo, set())
+        if ALL_REFS not in done:
+            git_runner.run(['fetch', '--tags', '-f', 'origin'],
+                           repo_path(repo))
+            done.add(ALL_REFS)
@@ -0,0 +1,112 @@
+"""
+Run git commands against the local repositories in BASE_DIR without changing
+the process's working directory, and fan per-repo work out on a bounded
+thread pool.
+
+Output from work run through run_in_repos is buffered per repo and printed in
+the order the repos were given once every repo has finished, so concurrent
+runs read the same as sequential ones.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import deploy_config
+import git_runner
+
+MAX_WORKERS = 4
+
+
+# String -> String
+def repo_path(repo):
+    return os.path.join(deploy_config.BASE_DIR, repo)
+
+
+class RepoTask:
+    """
+    Handle given to per-repo work run by run_in_repos. Commands run in the
+    repo's directory (under base_dir if given, BASE_DIR if not) and anything
+    they print is held until the whole batch is done.
+    """
+
+    def __init__(self, repo, base_dir=None):
+        self.repo = repo
+        if base_dir is None:
+            self.path = repo_path(repo)
+        else:
+            self.path = os.path.join(base_dir, repo)
+        self.lines = []
+
+    # String -> None
+    def log(self, msg):
+        self.lines.append(msg)
+
+    # [List-of String] -> String
+    def git(self, args):
+        """
+        Run git in the repo, holding its output with the task's. Returns
+        stdout; a failing command raises a git_runner.GitError, after its
+        output has been logged.
+        """
+        try:
+            result = git_runner.run(args, self.path)
+        except git_runner.GitError as e:
+            self.lines.append(e.output.rstrip('\n'))
+            raise
+        output = git_runner.combined_output(result)
+        if output:
+            self.lines.append(output)
+        return result.stdout
+
+    # None -> None
+    def flush(self):
+        if self.lines:
+            print('[{}]'.format(self.repo))
+            for line in self.lines:
+                print(line)
+        self.lines = []
+
+
+class RepoExecutionError(Exception):
+    """
+    Raised by run_in_repos once all repos have finished if any of them
+    failed. failures is a list of (repo, exception) in repo order.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        message = '; '.join('{}: {}'.format(repo, error)
+                            for repo, error in failures)
+        super().__init__('git work failed in {}'.format(message))
+
+
+# [RepoTask -> X] [List-of String] Integer [Maybe String] -> [List-of X]
+def run_in_repos(func, repos, max_workers=MAX_WORKERS, base_dir=None):
+    """
+    Call func with a RepoTask for every repo, concurrently, and return the
+    results in the order of repos. Buffered output is printed in the same
+    order after every repo is done, failed ones included. The repos are
+    looked for in base_dir instead of BASE_DIR if it's given.
+    """
+    tasks = [RepoTask(repo, base_dir) for repo in repos]
+    if not tasks:
+        return []
+
+    workers = min(max_workers, len(tasks))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, task) for task in tasks]
+
+    results = []
+    failures = []
+    for task, future in zip(tasks, futures):
+        task.flush()
+        error = future.exception()
+        if error is not None:
+            failures.append((task.repo, error))
+            results.append(None)
+        else:
+            results.append(future.result())
+
+    if failures:
+        raise RepoExecutionError(failures)
+    return results
@@ -0,0 +1,230 @@
+"""
+Opt-in timeline of the subprocesses and HTTP requests a command makes.
+
+Scripts run with --trace call enable(path). From then on every subprocess
+started through subprocess.Popen (which subprocess.call, run and
+check_output use), every Jenkins request and every requests-based HTTP call
+(GitHub) is recorded with what it was, the repo it ran in, how long it took,
+how it ended and how many bytes went each way. Plan actions are recorded as
+well, so the calls can be read against the step that made them.
+
+When the process exits the timeline is written to path as Chrome trace-event
+JSON (load it in chrome://tracing or ui.perfetto.dev) and the slowest
+operations are printed.
+
+With tracing off nothing is patched and span() only checks a global.
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# slowest operations listed in the summary
+SUMMARY_ROWS = 15
+
+recorder = None
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, category, name, args):
+        self.category = category
+        self.name = name
+        self.args = args
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    # ... -> None
+    def set(self, **args):
+        self.args.update(args)
+
+    # None -> None
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+            recorder.record(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args['error'] = repr(exc_value)
+        self.finish()
+        return False
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    # Span -> None
+    def record(self, span):
+        with self.lock:
+            if span.thread not in self.threads:
+                self.threads[span.thread] = len(self.threads) + 1
+            self.spans.append(span)
+
+    # None -> [List-of Dict]
+    def trace_events(self):
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                   'tid': tid, 'args': {'name': 'thread {}'.format(tid)}}
+                  for tid in sorted(self.threads.values())]
+        for span in self.spans:
+            events.append({'name': span.name, 'cat': span.category,
+                           'ph': 'X', 'pid': pid,
+                           'tid': self.threads[span.thread],
+                           'ts': round((span.start - self.origin) * 1e6),
+                           'dur': round((span.end - span.start) * 1e6),
+                           'args': span.args})
+        return events
+
+    # None -> String
+    def summary(self):
+        totals = {}
+        for span in self.spans:
+            count, seconds = totals.get(span.category, (0, 0))
+            totals[span.category] = (count + 1, seconds + span.end -
+                                     span.start)
+        lines = ['{:<12} {:>6} {:>10}'.format('category', 'calls', 'total')]
+        for category, (count, seconds) in sorted(totals.items()):
+            lines.append('{:<12} {:>6} {:>8.0f}ms'.format(category, count,
+                                                          seconds * 1000))
+
+        # actions contain the calls they make; rank the calls themselves
+        calls = [s for s in self.spans if s.category != 'action']
+        slowest = sorted(calls, key=lambda s: s.start - s.end)
+        lines.append('')
+        lines.append('{:>8}  {:<10} {:<22} {}'.format('ms', 'category',
+                                                      'repo', 'operation'))
+        for span in slowest[:SUMMARY_ROWS]:
+            outcome = span.args.get('exit', span.args.get('status', ''))
+            lines.append('{:>8.0f}  {:<10} {:<22} {}{}'.format(
+                (span.end - span.start) * 1000, span.category,
+                span.args.get('repo', '')[:22], span.name[:60],
+                ' [{}]'.format(outcome) if outcome not in ('', 0) else ''))
+        return '\n'.join(lines)
+
+    # None -> None
+    def export(self):
+        with self.lock:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': self.trace_events(),
+                           'displayTimeUnit': 'ms'}, f)
+            print(self.summary())
+            print('Trace written to {}'.format(self.path))
+
+
+class TracedPopen(subprocess.Popen):
+    """
+    Popen that records the process from start until it's waited on.
+    """
+
+    def __init__(self, args, *rest, **kwargs):
+        command = args if isinstance(args, str) else ' '.join(map(str, args))
+        cwd = kwargs.get('cwd') or os.getcwd()
+        self.trace_span = Span('subprocess', command_name(command),
+                               {'command': command,
+                                'repo': os.path.basename(
+                                    os.path.normpath(str(cwd)))})
+        super().__init__(args, *rest, **kwargs)
+
+    def wait(self, timeout=None):
+        code = super().wait(timeout)
+        self.trace_span.set(exit=code)
+        self.trace_span.finish()
+        return code
+
+    def communicate(self, input=None, timeout=None):
+        stdout, stderr = super().communicate(input, timeout)
+        self.trace_span.set(bytes_in=len(input or b''),
+                            bytes_out=len(stdout or b'') + len(stderr or b''))
+        return stdout, stderr
+
+
+# String -> String
+def command_name(command):
+    """
+    Short label for a command line: the program and its subcommand.
+    """
+    return ' '.join(command.split()[:2])
+
+
+# String String ... -> Span
+def span(category, name, **args):
+    """
+    Context manager timing an operation while tracing is on. set() on what
+    it returns adds details found out along the way.
+    """
+    if recorder is None:
+        return NULL_SPAN
+    return Span(category, name, args)
+
+
+# String -> String
+def default_path(label):
+    return os.path.abspath('{}-trace.json'.format(label))
+
+
+# String -> None
+def enable(path):
+    """
+    Start recording, and write the trace to path when the process exits.
+    """
+    global recorder
+    if recorder is not None:
+        return
+    recorder = Recorder(path)
+    subprocess.Popen = TracedPopen
+    trace_requests()
+    atexit.register(recorder.export)
+    print('Tracing to {}'.format(path), file=sys.stderr)
+
+
+# None -> None
+def trace_requests():
+    """
+    Record calls made through requests, which github_client uses.
+    """
+    try:
+        import requests
+    except ImportError:
+        return
+    send = requests.Session.send
+
+    def traced_send(session, request, **kwargs):
+        with span('http', '{} {}'.format(request.method, request.url),
+                  bytes_out=len(request.body or b'')) as s:
+            response = send(session, request, **kwargs)
+            s.set(status=response.status_code)
+            # reading response.content here would defeat stream=True and
+            # hold a second copy of a large download
+            length = response.headers.get('Content-Length', '')
+            if length.isdigit():
+                s.set(bytes_in=int(length))
+            return response
+
+    requests.Session.send = traced_send
@@ -0,0 +1,147 @@
+"""
+What changed in the HQ translations file since the previous release, and a
+cache of the text extracted from each mobile source file.
+
+entry_hashes and diff_entries compare two messages files key by key, through
+a hash of each key's value, and give the keys added, changed and removed.
+cached_extract skips re-extracting a source file whose git blob is the one
+it was last extracted from, by the same version of the extraction code.
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+
+from deploy_config import CACHE_DIR
+
+SOURCE_CACHE_PATH = os.path.join(CACHE_DIR, 'translation-sources.json')
+
+# keys sorted; added and changed hold (key, value) pairs
+TranslationDelta = namedtuple('TranslationDelta',
+                              ['added', 'changed', 'removed'])
+
+
+# String -> [Dict-of String String]
+def entries(text):
+    """
+    Maps each key in messages file text to its value. Headers, comments and
+    blank lines are skipped; a repeated key keeps its last value.
+    """
+    found = {}
+    for line in text.splitlines():
+        if not line.strip() or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        found[key.strip()] = value
+    return found
+
+
+# String -> String
+def value_hash(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+# String -> [Dict-of String String]
+def entry_hashes(text):
+    return dict((key, value_hash(value))
+                for key, value in entries(text).items())
+
+
+# [Dict-of String String] String -> TranslationDelta
+def diff_entries(old_hashes, new_text):
+    """
+    Compare the new messages text with the value hashes of the old.
+    """
+    new_entries = entries(new_text)
+    added = []
+    changed = []
+    for key in sorted(new_entries):
+        value = new_entries[key]
+        if key not in old_hashes:
+            added.append((key, value))
+        elif old_hashes[key] != value_hash(value):
+            changed.append((key, value))
+    removed = sorted(key for key in old_hashes if key not in new_entries)
+    return TranslationDelta(added, changed, removed)
+
+
+# TranslationDelta String -> String
+def summary(delta, since):
+    return '{} added, {} changed, {} removed since {}'.format(
+        len(delta.added), len(delta.changed), len(delta.removed), since)
+
+
+# TranslationDelta String -> String
+def delta_text(delta, since):
+    """
+    The delta as a messages file: added and changed keys with their new
+    values, then the removed keys.
+    """
+    lines = ['# {}'.format(summary(delta, since)), '']
+    for title, pairs in [('added', delta.added), ('changed', delta.changed)]:
+        lines.append('# *** {} ***'.format(title))
+        lines.extend('{}={}'.format(key, value) for key, value in pairs)
+        lines.append('')
+    lines.append('# *** removed ***')
+    lines.extend(delta.removed)
+    return '\n'.join(lines) + '\n'
+
+
+# String String String -> [Maybe (String, String)]
+def previous_version_file(directory, version_short, suffix):
+    """
+    (version, path) of the newest '<X.Y>-<suffix>' file in directory from a
+    release before version_short, if there is one.
+    """
+    pattern = re.compile(r'^(\d+)\.(\d+)-{}$'.format(re.escape(suffix)))
+    current = tuple(map(int, version_short.split('.')))
+    best = None
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            version = tuple(map(int, match.groups()))
+            if version < current and (best is None or version > best[0]):
+                best = (version, name)
+    if best is None:
+        return None
+    return ('{}.{}'.format(*best[0]), os.path.join(directory, best[1]))
+
+
+# None -> Dict
+def load_source_cache():
+    try:
+        with open(SOURCE_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Dict -> None
+def save_source_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = SOURCE_CACHE_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, SOURCE_CACHE_PATH)
+
+
+# Dict String String String [String -> String] Integer -> String
+def cached_extract(cache, cache_key, blob, contents, extract, version):
+    """
+    extract(contents), unless cache (see load_source_cache) has text
+    extracted under cache_key from the same blob by the same version of
+    extract, which is reused instead. blob is the contents' git object SHA;
+    version goes up whenever extract's output changes.
+    """
+    cached = cache.get(cache_key)
+    if (cached is not None and cached.get('blob') == blob and
+            cached.get('version') == version):
+        print('{} is unchanged; reusing its extracted text'.format(
+            cache_key))
+        return cached['text']
+
+    text = extract(contents)
+    cache[cache_key] = {'blob': blob, 'version': version, 'text': text}
+    return text
@@ -1,13 +1,20 @@
-import subprocess
+import io
 import os
+import posixpath
 import xml.etree.ElementTree as ET
+import git_runner
 import utils as util
+import remote_refs
+import translation_delta
 import re
 import sys
+from repo_executor import run_in_repos
 
 # name of the master hq translations file to be updated
 hq_translations_subdir = "historical-translations-by-version"
 unversioned_translations_filename = 'messages_en-2.txt'
+# keys changed since the previous release, written next to the full file
+delta_translations_filename = 'messages_en-2-delta.txt'
 
 # relative path to the subfolder within the javarosa repo containing the
 # messages_default.txt file
@@ -35,47 +42,44 @@ commcare_filename = 'messages_cc_default.txt'
 ccodk_messages_filename = 'android_translatable_strings.txt'
 ccodk_strings_filename = 'strings.xml'
 
+# TODO PLM: add the J2ME files on J2ME releases:
 #all_filenames = [javarosa_filename, commcare_filename,
  #                ccodk_messages_filename, ccodk_strings_filename]
 all_filenames = [ccodk_messages_filename, ccodk_strings_filename]
 all_repos = [commcare_core_repo,
              commcare_android_repo, translations_repo]
 
+# the sources are read from origin's master, without checking it out
+source_branch = 'master'
+source_ref = 'refs/remotes/origin/master'
+
 namespace = '{http://strings_namespace}'
 github_url = 'https://github.com/dimagi/commcare-translations/compare/'
 
 
 def update_translations(new_version_number):
-    if util.unstaged_changes_present(all_repos):
-        raise Exception("One of your repositories has un-staged changes, " +
-                        "please stash them and try again")
-    # TODO PLM: run this on J2ME releases:
-    # new_javarosa_text = get_updated_translations(j2me_repo,
-    #                                              javarosa_subfolder,
-    #                                              javarosa_filename)
-    # new_commcare_text = get_updated_translations(j2me_repo,
-    #                                              commcare_subfolder,
-    #                                              commcare_filename)
-    new_ccodk_text = get_updated_translations(commcare_android_repo,
-                                              ccodk_messages_subfolder,
-                                              ccodk_messages_filename)
-    new_strings_text = get_updated_strings_block()
-    new_text_blocks = [
-        new_ccodk_text, new_strings_text,
-        # new_javarosa_text, new_commcare_text,
-    ]
+    if util.unstaged_changes_present([translations_repo]):
+        raise Exception("Your translations repository has un-staged " +
+                        "changes, please stash them and try again")
+    new_text_blocks = get_source_blocks()
 
     new_branch_name = checkout_new_translations_branch(new_version_number)
     new_file_name = create_updated_translations_file(new_text_blocks, new_version_number)
-    commit_and_push_new_branch(new_version_number, new_branch_name, new_file_name)
+    delta_file_name, delta_summary = create_delta_file(new_file_name,
+                                                       new_version_number)
+    new_file_names = [new_file_name]
+    if delta_file_name is not None:
+        new_file_names.append(delta_file_name)
+    commit_and_push_new_branch(new_version_number, new_branch_name,
+                               new_file_names, delta_summary)
 
 
 def checkout_new_translations_branch(new_version_number):
     util.chdir_repo(translations_repo)
-    subprocess.call('git checkout master', shell=True)
-    subprocess.call('git pull origin master', shell=True)
+    git_runner.call(['checkout', 'master'])
+    remote_refs.pull(translations_repo, 'master', git_runner.call)
     new_branch_name = '{}_release_additions'.format(new_version_number)
-    subprocess.call('git checkout -b {}'.format(new_branch_name), shell=True)
+    git_runner.call(['checkout', '-b', new_branch_name])
     return new_branch_name
 
 
@@ -103,83 +107,195 @@ def create_updated_translations_file(new_text_blocks, new_version_number):
     return versioned_filename
 
 
-def commit_and_push_new_branch(new_version_number, new_branch, new_file_name):
-    subprocess.call('git add {}'.format(new_file_name), shell=True)
-    subprocess.call('git add {}'.format(unversioned_translations_filename), shell=True)
+def create_delta_file(new_file_name, new_version_number):
+    """
+    Write the keys added, changed and removed since the previous release's
+    translations file next to the new one, for HQ to ingest and reviewers
+    to read instead of the whole file. Returns the delta file's name and a
+    one line summary, or (None, None) if there's no previous release.
+    """
+    previous = translation_delta.previous_version_file(
+        hq_translations_subdir, new_version_number,
+        unversioned_translations_filename)
+    if previous is None:
+        print('No earlier translations file to compare {} with'.format(
+            new_file_name))
+        return None, None
+
+    previous_version, previous_file_name = previous
+    with open(previous_file_name, encoding='utf-8') as f:
+        old_hashes = translation_delta.entry_hashes(f.read())
+    with open(new_file_name, encoding='utf-8') as f:
+        delta = translation_delta.diff_entries(old_hashes, f.read())
+
+    delta_summary = translation_delta.summary(delta, previous_version)
+    print('Translations: {}'.format(delta_summary))
+    delta_file_name = '{}/{}-{}'.format(hq_translations_subdir,
+                                        new_version_number,
+                                        delta_translations_filename)
+    with open(delta_file_name, 'w', encoding='utf-8') as f:
+        f.write(translation_delta.delta_text(delta, previous_version))
+    return delta_file_name, delta_summary
+
+
+def commit_and_push_new_branch(new_version_number, new_branch, new_file_names,
+                               delta_summary=None):
+    git_runner.call(['add'] + new_file_names +
+                    [unversioned_translations_filename])
 
     commit_message = ('Auto-commit: Update translations for ' +
                       'CommCare release {}').format(new_version_number)
-    subprocess.call("git commit -m '{}'".format(commit_message),
-                    shell=True)
-    subprocess.call('git push origin {}'.format(new_branch), shell=True)
+    commit_args = ['commit', '-m', commit_message]
+    if delta_summary is not None:
+        commit_args += ['-m', delta_summary]
+    git_runner.call(commit_args)
+    git_runner.call(['push', 'origin', new_branch])
+    remote_refs.invalidate(translations_repo)
     pr_url = '{}{}'.format(github_url, new_branch)
     print(('An updated translations file has been pushed to GitHub ' +
            'as branch {0}. To create a PR out of this ' +
            'branch, you can go directly to {1}').format(new_branch, pr_url))
 
 
-def get_updated_translations(repo, relative_path, filename):
+def get_source_blocks():
+    """
+    The text that goes into the master hq translations file from each of
+    all_filenames, in order. Every repo's files are read from git objects
+    by one 'git cat-file', all repos at once, so no worktree is touched and
+    a missing ref or file fails the step.
+    """
+    by_repo = {}
+    for filename in all_filenames:
+        by_repo.setdefault(sources[filename][0], []).append(filename)
+
+    def read_sources(task):
+        remote_refs.fetch_branch(task.repo, source_branch)
+        objects = ['{}:{}'.format(source_ref, source_path(filename))
+                   for filename in by_repo[task.repo]]
+        return git_runner.cat_files(task.path, objects)
+
+    repos = list(by_repo)
+    blobs = {}
+    for repo, repo_blobs in zip(repos, run_in_repos(read_sources, repos)):
+        blobs.update(zip(by_repo[repo], repo_blobs))
+
+    cache = translation_delta.load_source_cache()
+    blocks = []
+    for filename in all_filenames:
+        repo, _, extract, version = sources[filename]
+        blob, contents = blobs[filename]
+        blocks.append(translation_delta.cached_extract(
+            cache, '{}/{}'.format(repo, filename), blob, contents, extract,
+            version))
+    translation_delta.save_source_cache(cache)
+    return blocks
+
+
+def source_path(filename):
+    repo, subfolder, _, _ = sources[filename]
+    return posixpath.normpath(posixpath.join(subfolder, filename))
+
+
+def get_updated_translations(contents):
     """
     Return a string containing the updated text that should go into the master
     hq translations file from the given file
     """
-    util.chdir_repo(repo)
-    os.chdir(relative_path)
-    with open(filename, 'r', encoding='utf-8') as f:
-        return f.read().strip()
+    return contents.strip()
 
 
-def get_updated_strings_block():
+def get_updated_strings_block(contents):
     """
     Return a string containing the updated text that should go into the master
     hq translations file from the strings.xml file in the mobile codebase.
     Because it is an xml file instead of a plain text file, the extraction
     needs to be done in a different way from all of the other files
     """
-    util.chdir_repo(commcare_android_repo)
-    subprocess.call('git checkout master', shell=True)
-    os.chdir(ccodk_strings_subfolder)
-    tree = ET.parse(ccodk_strings_filename)
-    resources = tree.getroot()
-    string_list = []
-    for string in resources.findall('string'):
-        translatable_value = string.get('{}translatable'.format(namespace))
-        if translatable_value == 'true':
-            name = string.get('name')
-            value = string.text
-            if name is not None and value is not None:
-                name_with_prefix = 'odk_{}'.format(name)
-                value = unescape_quotes(replace_string_format_syntax(value))
-                string_list.append(name_with_prefix + '=' + value + '\n')
-    return "".join(string_list)
+    # as bytes, so the parser goes by the file's own encoding declaration.
+    # The whole file is already in memory, read from git; streaming it only
+    # keeps the parse from building a tree on top.
+    source = io.BytesIO(contents.encode('utf-8', 'surrogateescape'))
+    return "".join(iter_strings_lines(source))
 
 
-def replace_string_format_syntax(value):
-    return re.sub(r'%(\d+\$)?s', replace_helper, value)
+def iter_strings_lines(source):
+    """
+    Yield the hq translations line of each translatable string in a
+    strings.xml file object. The file is parsed as a stream and each string
+    element is dropped once converted, so the parse's memory doesn't grow
+    with the number of strings.
+    """
+    translatable = '{}translatable'.format(namespace)
+    resources = None
+    depth = 0
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if resources is None:
+                resources = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        if element.tag == 'string' and element.get(translatable) == 'true':
+            name = element.get('name')
+            value = element.text
+            if name is not None and value is not None:
+                yield 'odk_{}={}\n'.format(name, convert_android_string(value))
+        # the children converted so far
+        resources.clear()
 
 
-def replace_helper(match_obj):
-    text = match_obj.group()
-    if len(text) == 2:
-        # This was just '%s', so want to use 0 as the index
-        new_index = 0
-    else:
-        # Otherwise, there is some number sitting in between '%' and '$s'
-        index = text[1:-2]
-        # Decrement this by 1 because HQ's indexing starts at 0 and ours starts
-        # at 1
-        new_index = int(index) - 1
-    return '${' + str(new_index) + '}'
+# an Android format placeholder or an escaped quote
+ANDROID_STRING_TOKEN = re.compile(r'%(?:(\d+)\$)?s|\\(["\'])')
 
 
-def unescape_quotes(text):
-    text = re.sub(r'\\"', '"', text)
-    text = re.sub(r"\\'", "'", text)
-    return text
+def convert_android_string(value):
+    """
+    Turn an Android string resource value into hq's format in one pass:
+    %s becomes ${0}, %N$s becomes ${N-1} and escaped quotes are unescaped.
+    Everything else is kept as it is.
+    """
+    def replace(match):
+        index, quote = match.groups()
+        if quote is not None:
+            return quote
+        if index is None:
+            # This was just '%s', so want to use 0 as the index
+            return '${0}'
+        # HQ's indexing starts at 0 and Android's at 1
+        return '${' + str(int(index) - 1) + '}'
+
+    return ANDROID_STRING_TOKEN.sub(replace, value)
+
+
+# versions of the text block functions: bump one whenever its output
+# changes, so text the old code extracted isn't reused from the cache
+translations_version = 1
+strings_block_version = 3
+
+# each of all_filenames: the repo and subfolder it's read from, and the
+# function making its text block and its version
+sources = {
+    javarosa_filename: (j2me_repo, javarosa_subfolder,
+                        get_updated_translations, translations_version),
+    commcare_filename: (j2me_repo, commcare_subfolder,
+                        get_updated_translations, translations_version),
+    ccodk_messages_filename: (commcare_android_repo, ccodk_messages_subfolder,
+                              get_updated_translations, translations_version),
+    ccodk_strings_filename: (commcare_android_repo, ccodk_strings_subfolder,
+                             get_updated_strings_block,
+                             strings_block_version),
+}
 
 
 # for running this script independently of the rest of the deploy scripts
 def main():
+    if '--trace' in sys.argv:
+        sys.argv.remove('--trace')
+        import tracing
+        tracing.enable(tracing.default_path('update_translations'))
+
     if len(sys.argv) > 2:
         filename = sys.argv[0]
         arg_count = len(sys.argv) - 1
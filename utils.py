@@ -1,47 +1,49 @@
-import subprocess
 import os
-from deploy_config import BASE_DIR, BRANCH_BASE
-import pkg_resources
-from pkg_resources import VersionConflict
+import re
+import hashlib
+import deploy_config
+from deploy_config import BRANCH_BASE, CACHE_DIR
+from repo_executor import run_in_repos, RepoTask
+import git_runner
+import remote_refs
+import worktrees
 import sys
 
+REQUIREMENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'requirements.txt')
+# remembers the last requirements.txt that was fully satisfied, so the check
+# only runs again when the file (or the python install) changes
+REQUIREMENTS_CHECK_CACHE = os.path.join(CACHE_DIR, 'requirements-ok')
+REQUIREMENT_PATTERN = re.compile(
+    r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(==|>=|<=|!=|>|<)?\s*([^\s;#]*)')
+
 
 # None -> None
 def pull_masters(repos):
-    for repo in repos:
-        chdir_repo(repo)
-        subprocess.call('git pull origin master', shell=True)
-        chdir_base()
+    run_in_repos(lambda task: remote_refs.pull(task.repo, 'master', task.git),
+                 repos)
 
 
 # String -> None
 def chdir_repo(repo):
-    os.chdir(os.path.join(BASE_DIR, repo))
-
-
-# None -> None
-def chdir_base():
-    os.chdir(BASE_DIR)
+    os.chdir(os.path.join(deploy_config.BASE_DIR, repo))
 
 
 # None -> Boolean
 def unstaged_changes_present(repos):
-    for repo in repos:
-        chdir_repo(repo)
-        cmd = "git status -s | sed '/^??/d'"
-        cmd_result = subprocess.check_output(cmd, shell=True)
-        if b'' != cmd_result:
-            return True
-        chdir_base()
-    return False
+    return any(run_in_repos(has_unstaged_changes, repos))
+
+
+# RepoTask -> Boolean
+def has_unstaged_changes(task):
+    return any(entry.code != '??' for entry in git_runner.status(task.path))
 
 
 # String -> Boolean
 def branch_exists_in_repos(branch_name, repos):
-    for x in [branch_exists(repo, branch_name) for repo in repos]:
-        if x:
-            return True
-    return False
+    return any(run_in_repos(lambda task: branch_exists(task.repo,
+                                                       branch_name),
+                            repos))
 
 
 # String String -> Boolean
@@ -49,21 +51,11 @@ def branch_exists(child_directory, branch_name):
     """
     Check if branch exists on remote server. Doesn't check locally
     """
-    chdir_repo(child_directory)
     try:
-        git_command = 'git ls-remote origin {}'.format(branch_name)
-        result = subprocess.check_output(git_command, shell=True)
-        return str(result).find('refs/heads/{}'.format(branch_name)) != -1
-    except subprocess.CalledProcessError:
+        return remote_refs.get_remote_refs(child_directory).has_branch(
+            branch_name)
+    except git_runner.GitError:
         return False
-    finally:
-        chdir_base()
-
-
-# String -> None
-def print_with_newlines(msg):
-    for line in msg.split('\\n'):
-        print(line)
 
 
 # String String -> Integer
@@ -71,43 +63,134 @@ def get_last_hotfix_number_in_repo(repo, version_short_str):
     """
     Find the latest hotfix by looking at remote tag names
     """
-    chdir_repo(repo)
-    filter_tag_cmd = "awk '{ print $2 }'"
-    filter_hotfix_number = "awk -F'.' '{ print $3 }'"
+    refs = remote_refs.get_remote_refs(repo)
+    last_hotfix = refs.last_hotfix(version_short_str)
+    if last_hotfix is None:
+        raise Exception("no {}{}.X release tags found in {}".format(
+            BRANCH_BASE, version_short_str, repo))
+    return last_hotfix
 
-    tag = "{}{}".format(BRANCH_BASE, version_short_str)
-    git_cmd = "git ls-remote origin 'refs/tags/{}.*'".format(tag)
-    get_hotfix_cmd = "{} | {} | {}".format(git_cmd,
-                                           filter_tag_cmd,
-                                           filter_hotfix_number)
-    result = subprocess.check_output(get_hotfix_cmd, shell=True)
-    hotfixes = list(map(int, filter(lambda x: x.isdigit(),
-                                    result.split(b'\n'))))
-    hotfixes.sort()
-    chdir_base()
 
-    return hotfixes[-1]
+# String String Boolean -> None
+def checkout_ref(repo, ref, full_fetch=False):
+    """
+    Check ref out in its worktree (see worktrees.py), leaving the repo's own
+    checkout alone.
+    """
+    task = RepoTask(repo)
+    fetch_and_checkout(task, ref, full_fetch)
+    task.flush()
 
 
-# String String -> None
-def checkout_ref(repo, ref):
-    print("checking out {} ref for {} repo".format(ref, repo))
-    chdir_repo(repo)
-    subprocess.call('git fetch --tags -f', shell=True)
-    subprocess.call('git checkout {}'.format(ref), shell=True)
-    chdir_base()
+# RepoTask String Boolean -> None
+def fetch_and_checkout(task, ref, full_fetch=False):
+    """
+    Checkout ref in its worktree after fetching it, or every branch and tag
+    if full_fetch. Safe to run from run_in_repos; output goes through the
+    task.
+    """
+    task.log("checking out {} ref for {} repo".format(ref, task.repo))
+    if full_fetch:
+        remote_refs.fetch_all(task.repo)
+    else:
+        remote_refs.fetch_ref(task.repo, ref)
+    path = worktrees.checkout(task.repo, ref)
+    task.log("{} is checked out in {}".format(ref, path))
 
 
 def assert_packages():
+    with open(REQUIREMENTS_FILE, 'rb') as f:
+        contents = f.read()
+    key = hashlib.sha256(sys.executable.encode('utf-8') + b'\0' +
+                         contents).hexdigest()
     try:
-        pkg_resources.require(get_dependencies())
-    except VersionConflict as e:
+        with open(REQUIREMENTS_CHECK_CACHE, 'r') as f:
+            if f.read().strip() == key:
+                return
+    except OSError:
+        pass
+
+    problems = unmet_requirements(contents.decode('utf-8').split("\n"))
+    if problems:
         print("Missing a library requirement, please update:")
-        print(str(e))
+        for problem in problems:
+            print(problem)
         sys.exit(0)
 
+    try:
+        os.makedirs(os.path.dirname(REQUIREMENTS_CHECK_CACHE), exist_ok=True)
+        with open(REQUIREMENTS_CHECK_CACHE, 'w') as f:
+            f.write(key)
+    except OSError:
+        pass
+
 
-# None -> [List-of String]
-def get_dependencies():
-    with open("requirements.txt", 'r') as f:
-        return f.read().split("\n")
+# [List-of String] -> [List-of String]
+def unmet_requirements(requirements):
+    """
+    Check requirement lines of the form 'name', 'name==1.2.3' (or another
+    comparison) against the installed distributions.
+    """
+    from importlib import metadata
+
+    problems = []
+    for line in requirements:
+        match = REQUIREMENT_PATTERN.match(line)
+        if match is None:
+            continue
+        name, op, wanted = match.groups()
+        try:
+            installed = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            problems.append("{} is not installed".format(line.strip()))
+            continue
+        if op and not version_satisfies(installed, op, wanted):
+            problems.append("{} {} is installed, need {}".format(
+                name, installed, line.strip()))
+    return problems
+
+
+# String String String -> Boolean
+def version_satisfies(installed, op, wanted):
+    """
+    Compare by packaging's version rules when it's installed, and otherwise
+    by the versions' leading release numbers, so 2.9 < 2.20 and 2.20 ==
+    2.20.0. Versions without numbers are only compared for equality.
+    """
+    try:
+        from packaging.specifiers import InvalidSpecifier, SpecifierSet
+    except ImportError:
+        SpecifierSet = None
+    if SpecifierSet is not None:
+        try:
+            return SpecifierSet(op + wanted).contains(installed,
+                                                      prereleases=True)
+        except InvalidSpecifier:
+            pass
+
+    installed_key, wanted_key = release_key(installed), release_key(wanted)
+    if installed_key is None or wanted_key is None:
+        if op == '!=':
+            return installed != wanted
+        return installed == wanted and op in ('==', '>=', '<=')
+    width = max(len(installed_key), len(wanted_key))
+    installed_key += (0,) * (width - len(installed_key))
+    wanted_key += (0,) * (width - len(wanted_key))
+    return {'==': installed_key == wanted_key,
+            '!=': installed_key != wanted_key,
+            '>=': installed_key >= wanted_key,
+            '<=': installed_key <= wanted_key,
+            '>': installed_key > wanted_key,
+            '<': installed_key < wanted_key}[op]
+
+
+# String -> [Maybe (Integer, ...)]
+def release_key(version):
+    """
+    The leading dotted numbers of version as a tuple, e.g. (2, 20) for
+    '2.20rc1'.
+    """
+    match = re.match(r'\d+(\.\d+)*', version)
+    if match is None:
+        return None
+    return tuple(int(part) for part in match.group(0).split('.'))
@@ -1,4 +1,14 @@
+from functools import lru_cache, total_ordering
+
+
+@total_ordering
 class Version:
+    """
+    A CommCare X.Y.Z version. Versions compare in release order and can be
+    used in sets and as dict keys; don't change one after it's made.
+    """
+    __slots__ = ('major', 'minor', 'hotfix')
+
     def __init__(self, major, minor, hotfix):
         self.major = major
         self.minor = minor
@@ -7,6 +17,33 @@ class Version:
     def __str__(self):
         return "{0}.{1}.{2}".format(self.major, self.minor, self.hotfix)
 
+    def __repr__(self):
+        return "Version({0}, {1}, {2})".format(self.major, self.minor,
+                                               self.hotfix)
+
+    def key(self):
+        return (self.major, self.minor, self.hotfix)
+
+    def __eq__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key() == other.key()
+
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key() < other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    @staticmethod
+    def parse(version_str):
+        """
+        Version from an 'X.Y.Z' string
+        """
+        return parse_version(version_str)
+
     def short_string(self):
         return "{0}.{1}".format(self.major, self.minor)
 
@@ -35,5 +72,15 @@ class Version:
         return Version(self.major, self.minor - 1, 0)
 
 
+# String -> Version
+@lru_cache(maxsize=4096)
+def parse_version(version_str):
+    parts = version_str.split('.')
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        raise VersionException("can't parse version {!r}".format(
+            version_str))
+    return Version(*map(int, parts))
+
+
 class VersionException(Exception):
     pass
@@ -0,0 +1,193 @@
+"""
+Where each repo keeps its version numbers, and how each kind of bump changes
+them.
+
+BUMPS maps a bump to its commit message and, for each repo it touches, the
+version locations it rewrites. A location is a file, a pattern whose groups
+are the parts of the version (or of a version tag) and the rule in RULES
+giving the new parts. Where the pattern could match more than the version,
+the location's anchors are patterns for the file's current version, one
+group per part, and only matches of that version are rewritten. Versioning
+another file only takes another location.
+"""
+
+import re
+from collections import namedtuple
+
+CONFIG_ENGINE_PATH = \
+    'src/cli/java/org/commcare/util/engine/CommCareConfigEngine.java'
+BUILD_PROPERTIES_PATH = 'application/build.properties'
+MANIFEST_PATH = 'app/AndroidManifest.xml'
+
+Location = namedtuple('Location', ['path', 'pattern', 'rule', 'anchors'])
+Bump = namedtuple('Bump', ['message', 'locations'])
+
+
+class VersionBumpError(Exception):
+    pass
+
+
+# [List-of String] -> [List-of String]
+def next_minor(parts):
+    """
+    X.Y -> X.Y+1 and X.Y.Z -> X.Y+1.0
+    """
+    return ([parts[0], str(int(parts[1]) + 1)] +
+            ['0' for _ in parts[2:]])
+
+
+# [List-of String] -> [List-of String]
+def next_hotfix(parts):
+    return parts[:2] + [str(int(parts[2]) + 1)]
+
+
+# [List-of String] -> [List-of String]
+def add_hotfix_zero(parts):
+    return parts + ['0']
+
+
+RULES = {'minor': next_minor,
+         'hotfix': next_hotfix,
+         'add-hotfix-zero': add_hotfix_zero,
+         'alpha': lambda parts: ['alpha'],
+         'release': lambda parts: ['']}
+
+
+# String String String [List-of String] -> Location
+def location(path, pattern, rule, anchors=()):
+    if rule not in RULES:
+        raise VersionBumpError("no bump rule named {!r}".format(rule))
+    return Location(path, re.compile(pattern), rule,
+                    [re.compile(anchor) for anchor in anchors])
+
+
+MANIFEST_VERSION = r'android:versionName="(\d+)\.(\d+)"'
+MANIFEST_HOTFIX_VERSION = r'android:versionName="(\d+)\.(\d+)\.(\d+)"'
+BUILD_PROPERTIES_VERSION = r'app\.version=(\d+)\.(\d+)\.(\d+)'
+# CommCarePlatform(X, Y) of the version the config engine declares
+CONFIG_ENGINE_VERSION = [r'MAJOR_VERSION = (\d+);', r'MINOR_VERSION = (\d+);']
+VERSION_TAG = r'commcare\.version=v\$\{{app\.version\}}({})'
+
+BUMPS = {
+    # the next release's version, on master once the release is branched
+    'master': Bump('Automated version bump', {
+        'commcare-core': [
+            location(CONFIG_ENGINE_PATH, r'CommCarePlatform\((\d+), (\d+)\)',
+                     'minor', CONFIG_ENGINE_VERSION)],
+        'commcare-android': [
+            location(MANIFEST_PATH, MANIFEST_VERSION, 'minor')]}),
+    'hotfix': Bump('Automated hotfix version bump', {
+        'commcare-core': [
+            location(BUILD_PROPERTIES_PATH, BUILD_PROPERTIES_VERSION,
+                     'hotfix')],
+        'commcare-android': [
+            location(MANIFEST_PATH, MANIFEST_HOTFIX_VERSION, 'hotfix')]}),
+    'add hotfix': Bump(
+        'Automated: adding hotfix version to AndroidManifest', {
+            'commcare-android': [
+                location(MANIFEST_PATH, MANIFEST_VERSION,
+                         'add-hotfix-zero')]}),
+    # J2ME builds
+    'alpha': Bump('Automated commit adding dev tag to commcare version', {
+        'commcare-core': [
+            location(BUILD_PROPERTIES_PATH, VERSION_TAG.format('dev'),
+                     'alpha')]}),
+    'release': Bump("Automated: removing 'alpha' from version", {
+        'commcare-j2me': [
+            location(BUILD_PROPERTIES_PATH, VERSION_TAG.format('alpha'),
+                     'release')]}),
+}
+
+
+# String String -> [Dict-of String [String -> String]]
+def file_edits(bump, repo):
+    """
+    Maps each file the bump changes in the repo to a function applying all
+    of that file's rules to its contents.
+    """
+    by_path = {}
+    for loc in BUMPS[bump].locations[repo]:
+        by_path.setdefault(loc.path, []).append(loc)
+    return dict((path, lambda contents, locs=locs: apply_locations(
+        repo, contents, locs)) for path, locs in by_path.items())
+
+
+# String String [List-of Location] -> String
+def apply_locations(repo, contents, locations):
+    for loc in locations:
+        contents = apply_location(repo, contents, loc)
+    return contents
+
+
+# String String Location -> String
+def apply_location(repo, contents, loc):
+    """
+    Rewrite every match of the location's pattern (of its anchored version,
+    if it has anchors) by its rule. A file without one is an error: it isn't
+    where its version is expected to be.
+    """
+    current = anchored_version(repo, contents, loc)
+    replaced = []
+
+    def replace(match):
+        if current is not None and list(match.groups()) != current:
+            return match.group(0)
+        new = splice(match, RULES[loc.rule](list(match.groups())))
+        print('{} {}: replacing {} with {}'.format(repo, loc.path,
+                                                   match.group(0), new))
+        replaced.append(new)
+        return new
+
+    new_contents = loc.pattern.sub(replace, contents)
+    if not replaced:
+        wanted = loc.pattern.pattern
+        if current is not None:
+            wanted = '{} for version {}'.format(wanted, '.'.join(current))
+        raise VersionBumpError("couldn't find {} in {} {}".format(
+            wanted, repo, loc.path))
+    return new_contents
+
+
+# String String Location -> [Maybe [List-of String]]
+def anchored_version(repo, contents, loc):
+    """
+    The version parts the location's anchors find in contents, or None if
+    it has no anchors.
+    """
+    if not loc.anchors:
+        return None
+    parts = []
+    for anchor in loc.anchors:
+        match = anchor.search(contents)
+        if match is None:
+            raise VersionBumpError("couldn't find {} in {} {}".format(
+                anchor.pattern, repo, loc.path))
+        parts.extend(match.groups())
+    return parts
+
+
+# Match [List-of String] -> String
+def splice(match, parts):
+    """
+    The matched text with its groups replaced by parts. Parts beyond the
+    groups follow the last one, with the separator found before it ('.' if
+    there's only one group).
+    """
+    text = match.group(0)
+    offset = match.start()
+    groups = match.re.groups
+    spans = [(match.start(i) - offset, match.end(i) - offset)
+             for i in range(1, groups + 1)]
+    separator = '.'
+    if groups > 1:
+        separator = text[spans[-2][1]:spans[-1][0]]
+
+    pieces = []
+    position = 0
+    for (start, end), part in zip(spans, parts):
+        pieces.append(text[position:start])
+        pieces.append(part)
+        position = end
+    pieces.extend(separator + part for part in parts[groups:])
+    pieces.append(text[position:])
+    return ''.join(pieces)
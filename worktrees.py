@@ -0,0 +1,164 @@
+"""
+Managed git worktrees for the release branches and tags the scripts check
+out.
+
+A branch or tag a command needs checked out gets its own worktree under
+WORKTREE_DIR/<repo>/<ref>, created the first time it's needed and reused by
+later commands; a branch's worktree is fast-forwarded to origin's branch
+when it's reused. The clones in BASE_DIR stay on whatever the operator has
+checked out, and more than one release line can be checked out at once.
+deploy finalize removes a release's worktrees along with its branch.
+"""
+
+import os
+from collections import namedtuple
+
+import git_runner
+import remote_refs
+from deploy_config import CACHE_DIR
+from repo_executor import repo_path
+
+WORKTREE_DIR = os.path.join(CACHE_DIR, 'worktrees')
+
+# branch is None for a detached worktree
+Worktree = namedtuple('Worktree', ['path', 'head', 'branch'])
+
+
+# String String -> String
+def worktree_path(repo, ref):
+    return os.path.join(WORKTREE_DIR, repo, ref)
+
+
+# String String -> Boolean
+def same_path(a, b):
+    return os.path.realpath(a) == os.path.realpath(b)
+
+
+# String -> [List-of Worktree]
+def list_worktrees(repo):
+    """
+    Every checkout of the repo, the clone itself included.
+    """
+    worktrees = []
+    text = git_runner.output(['worktree', 'list', '--porcelain'],
+                             repo_path(repo))
+    for block in text.split('\n\n'):
+        fields = dict((line.split(' ', 1) + [''])[:2]
+                      for line in block.splitlines())
+        if 'worktree' not in fields:
+            continue
+        branch = fields.get('branch')
+        if branch is not None and branch.startswith('refs/heads/'):
+            branch = branch[len('refs/heads/'):]
+        worktrees.append(Worktree(fields['worktree'], fields.get('HEAD'),
+                                  branch))
+    return worktrees
+
+
+class WorktreeError(Exception):
+    pass
+
+
+# String String [Maybe String] -> String
+def branch_worktree(repo, branch, start_point=None):
+    """
+    Path of the managed worktree of branch. One that already exists is
+    reused, fast-forwarded to origin's branch. Otherwise a worktree is
+    added, creating the branch from start_point if given, or tracking
+    origin's branch if there's no local one. A branch checked out anywhere
+    else, such as the operator's clone, is an error: git won't check it out
+    twice, and the scripts leave the operator's checkouts alone.
+    """
+    path = worktree_path(repo, branch)
+    for worktree in list_worktrees(repo):
+        if worktree.branch != branch:
+            continue
+        if not same_path(worktree.path, path):
+            raise WorktreeError(
+                '{} is checked out in {}; check out another branch there so '
+                'it can be checked out in {}'.format(branch, worktree.path,
+                                                     path))
+        fast_forward(path, branch)
+        return path
+
+    if start_point is None:
+        add_worktree(repo, [path, branch])
+    else:
+        add_worktree(repo, ['-b', branch, path, start_point])
+    return path
+
+
+# String String -> None
+def fast_forward(path, branch):
+    """
+    Bring the worktree at path up to origin's branch, as last fetched.
+    """
+    try:
+        git_runner.run(['merge', '--ff-only', '-q',
+                        'refs/remotes/origin/{}'.format(branch)], path)
+    except git_runner.UnknownRefError:
+        # origin doesn't have the branch (yet)
+        pass
+    except git_runner.GitError as e:
+        raise WorktreeError('{} in {} has commits origin doesn\'t; push or '
+                            'drop them: {}'.format(branch, path, e))
+
+
+# String String -> String
+def detached_worktree(repo, ref):
+    """
+    Path of a managed worktree with ref (a tag or SHA) checked out.
+    """
+    path = worktree_path(repo, ref)
+    existing = [w for w in list_worktrees(repo) if same_path(w.path, path)]
+    if existing:
+        git_runner.run(['checkout', '-q', '--detach', ref], path)
+    else:
+        add_worktree(repo, ['--detach', path, ref])
+    return path
+
+
+# String [List-of String] -> None
+def add_worktree(repo, args):
+    cwd = repo_path(repo)
+    try:
+        git_runner.run(['worktree', 'add'] + args, cwd)
+    except git_runner.GitError:
+        # the path may still be registered to a worktree whose directory
+        # was deleted by hand; forget those and try once more
+        git_runner.run(['worktree', 'prune'], cwd)
+        git_runner.run(['worktree', 'add'] + args, cwd)
+
+
+# String String -> String
+def checkout(repo, ref):
+    """
+    Path of a worktree with ref checked out: origin's branches as local
+    branches, anything else detached.
+    """
+    if remote_refs.get_remote_refs(repo).has_branch(ref):
+        return branch_worktree(repo, ref)
+    return detached_worktree(repo, ref)
+
+
+# String String -> [List-of (String, [Maybe GitError])]
+def remove_worktrees(repo, branch):
+    """
+    Remove the managed worktrees of branch and of the tags cut from it
+    (branch.N). Worktrees with local changes are kept; each path is returned
+    with the error that kept it, if any.
+    """
+    managed = os.path.join(WORKTREE_DIR, repo)
+    results = []
+    for worktree in list_worktrees(repo):
+        parent, name = os.path.split(worktree.path)
+        release = name == branch or name.startswith(branch + '.')
+        if not release or not same_path(parent, managed):
+            continue
+        try:
+            git_runner.run(['worktree', 'remove', worktree.path],
+                           repo_path(repo))
+            results.append((worktree.path, None))
+        except git_runner.GitError as e:
+            results.append((worktree.path, e))
+    return results